@@ -24,4 +24,93 @@ TEST_CHANNEL_ID = os.getenv("TELEGRAM_CHAT_ID", "@tesisori")
 EXCEL_FILE_PATH = "telegram_bot_data.db"  # Упрощенный путь для SQLite, будет создан в текущей директории
 MAX_CAPTION_LENGTH = 1024
 MAX_POST_LENGTH = 950
-IMGUR_CLIENT_ID = "ec196cbda352060"
+
+# Параллельная обработка обновлений
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "20"))  # Сколько чатов обрабатываются одновременно
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "20"))  # Максимальная очередь обновлений одного чата
+DISPATCH_OVERFLOW_LIMIT = int(os.getenv("DISPATCH_OVERFLOW_LIMIT", "1000"))  # Сколько обновлений сверх очередей чатов ждут во всех чатах вместе
+
+# Ограничения параллельных запросов к провайдерам при пакетной генерации
+OPENROUTER_MAX_CONCURRENCY = int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "4"))
+FLUX_MAX_CONCURRENCY = int(os.getenv("FLUX_MAX_CONCURRENCY", "3"))  # Генераций изображений одновременно: прямые запросы или задачи в очереди fal.ai
+MISTRAL_MAX_CONNECTIONS = int(os.getenv("MISTRAL_MAX_CONNECTIONS", "10"))  # Размер пула соединений Mistral AI
+GOOGLE_AI_MAX_WORKERS = int(os.getenv("GOOGLE_AI_MAX_WORKERS", "4"))  # Потоков для вызовов синхронного SDK Google AI
+
+# Генерировать изображение одновременно с текстом поста
+OVERLAP_IMAGE_GENERATION = os.getenv("OVERLAP_IMAGE_GENERATION", "true").lower() == "true"
+
+# Отложенная запись статистики использования
+USAGE_STATS_BATCH_SIZE = int(os.getenv("USAGE_STATS_BATCH_SIZE", "100"))  # Сброс по размеру пакета
+USAGE_STATS_FLUSH_INTERVAL = float(os.getenv("USAGE_STATS_FLUSH_INTERVAL", "5"))  # Сброс по таймеру, секунды
+
+# Кэш настроек клиентов
+SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", "10000"))  # Максимум записей в кэше
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "600"))  # Время жизни записи, секунды
+
+# Хранилище состояния диалогов
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", "10000"))  # Сколько активных чатов держать в памяти
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "2"))  # Период записи изменений, секунды
+STATE_TTL_DAYS = int(os.getenv("STATE_TTL_DAYS", "30"))  # Через сколько дней без активности состояние удаляется
+STATE_COMPACT_INTERVAL = float(os.getenv("STATE_COMPACT_INTERVAL", "3600"))  # Период очистки, секунды
+
+# Кэш ответов языковых моделей
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))  # Время жизни ответа, секунды
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))  # Максимум ответов в базе
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "500"))  # Максимум ответов в памяти
+
+# Маршрутизация запросов между моделями OpenRouter
+ROUTER_WINDOW_SIZE = int(os.getenv("ROUTER_WINDOW_SIZE", "20"))  # Сколько последних запросов учитывать
+ROUTER_WINDOW_SECONDS = float(os.getenv("ROUTER_WINDOW_SECONDS", "600"))  # Замеры старше этого забываются
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))  # Ошибок подряд до отключения модели
+ROUTER_COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", "60"))  # Начальное время отключения, секунды
+ROUTER_MAX_COOLDOWN = float(os.getenv("ROUTER_MAX_COOLDOWN", "600"))  # Максимальное время отключения, секунды
+ROUTER_RATE_LIMIT_COOLDOWN = float(os.getenv("ROUTER_RATE_LIMIT_COOLDOWN", "60"))  # Отключение после ответа 429
+
+# Хеджирование запросов к текстовым провайдерам
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"  # Включается явно
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))  # Перцентиль задержки для порога
+HEDGE_WINDOW_SIZE = int(os.getenv("HEDGE_WINDOW_SIZE", "50"))  # Сколько последних замеров учитывать
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "5"))  # Минимум замеров для расчета перцентиля
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "8"))  # Порог, пока замеров мало, секунды
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))  # Нижняя граница порога, секунды
+
+# Потоковая генерация постов
+STREAM_POST_PROGRESS = os.getenv("STREAM_POST_PROGRESS", "true").lower() == "true"  # Показывать текст поста по мере генерации
+STREAM_PROGRESS_INTERVAL = float(os.getenv("STREAM_PROGRESS_INTERVAL", "1.5"))  # Не чаще одного обновления за столько секунд
+STREAM_HASHTAG_RESERVE = int(os.getenv("STREAM_HASHTAG_RESERVE", "150"))  # Запас сверх MAX_POST_LENGTH на хэштеги
+
+# Пакетная генерация: заголовки, тексты и промпты изображений всех постов одним запросом
+BATCH_GENERATION = os.getenv("BATCH_GENERATION", "true").lower() == "true"
+
+# Кэш изображений FLUX на диске
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")  # Каталог с файлами изображений
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))  # Максимальный общий размер, байты
+
+# Генерация изображений через очередь fal.ai
+FLUX_USE_QUEUE = os.getenv("FLUX_USE_QUEUE", "true").lower() == "true"  # false — прежние синхронные запросы
+FLUX_POLL_INTERVAL = float(os.getenv("FLUX_POLL_INTERVAL", "1"))  # Начальный интервал опроса статуса, секунды
+FLUX_MAX_POLL_INTERVAL = float(os.getenv("FLUX_MAX_POLL_INTERVAL", "5"))  # Максимальный интервал опроса, секунды
+FLUX_JOB_TIMEOUT = float(os.getenv("FLUX_JOB_TIMEOUT", "300"))  # Сколько ждать завершения задачи, секунды
+
+# Клиент Telegram Bot API: пул соединений и лимиты отправки
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "100"))  # Максимум одновременных соединений
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # Сообщений в секунду на бота
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))  # Сообщений в секунду в личный чат
+TELEGRAM_GROUP_RATE_PER_MIN = float(os.getenv("TELEGRAM_GROUP_RATE_PER_MIN", "20"))  # Сообщений в минуту в группу или канал
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))  # Сколько сообщений в чат можно отправить подряд без ожидания
+
+# Получение обновлений: "polling" (getUpdates) или "webhook"
+UPDATE_MODE = os.getenv("UPDATE_MODE", "polling").lower()
+PORT = int(os.getenv("PORT", "10000"))  # Порт HTTP-сервера (Render передает его в переменной PORT)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or os.getenv("RENDER_EXTERNAL_URL", "")  # Публичный адрес сервиса
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Пусто — случайный секрет при каждом запуске
+SCHEDULE_CHECK_INTERVAL = float(os.getenv("SCHEDULE_CHECK_INTERVAL", "300"))  # Период проверки расписания, секунды
+
+# HTTP-проверки /healthz, /readyz и метрики /metrics
+READY_MAX_LOOP_LAG = float(os.getenv("READY_MAX_LOOP_LAG", "1"))  # Задержка цикла событий, при которой бот не готов, секунды
+READY_TELEGRAM_CHECK_INTERVAL = float(os.getenv("READY_TELEGRAM_CHECK_INTERVAL", "60"))  # Как часто проверять доступность Telegram, секунды
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "5"))  # Таймаут проверки базы и Telegram, секунды
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))  # Период измерения задержки цикла событий, секунды
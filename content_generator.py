@@ -6,10 +6,18 @@ import re
 import traceback
 import os
 from dotenv import load_dotenv
-from config import MAX_POST_LENGTH, OPENROUTER_API_KEY
-from prompts import TITLE_PROMPT, POST_PROMPT, IMAGE_PROMPT
+from config import (
+    MAX_POST_LENGTH, OPENROUTER_API_KEY, OPENROUTER_MAX_CONCURRENCY, LLM_CACHE_ENABLED, HEDGE_ENABLED,
+    STREAM_PROGRESS_INTERVAL, STREAM_HASHTAG_RESERVE
+)
+from prompts import TITLE_PROMPT, POST_PROMPT, HASHTAG_PROMPT, IMAGE_PROMPT, BATCH_PROMPT
 from mistral_ai import MistralAPI  # Добавляем импорт нового класса
 from google_ai import GoogleAI  # Импорт Google AI
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from model_router import ModelRouter
+from hedging import LatencyTracker, hedged_call
+from sse import iter_sse_json, chunk_text, finish_reason, StreamInterrupted
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -24,17 +32,158 @@ logging.basicConfig(
     ]
 )
 
+# Так начинаются строки, которые Mistral AI и Google AI возвращают вместо результата при ошибке
+ERROR_PREFIXES = ("Ошибка", "Критическая ошибка", "API ключ")
+
+def is_valid_text(text):
+    """Проверяет, что провайдер вернул текст, а не пустой ответ или сообщение об ошибке."""
+    return isinstance(text, str) and bool(text.strip()) and not text.startswith(ERROR_PREFIXES)
+
+def build_titles_prompt(theme, post_count, language="en"):
+    """Формирует промпт для генерации заголовков."""
+    # TITLE_PROMPT — общий шаблон для всех языков
+    prompt = TITLE_PROMPT.format(post_count=post_count, theme=theme)
+    
+    # Добавляем инструкции для модели по формату и количеству
+    prompt += f"\n\nВажно: генерируй ровно {post_count} заголовков на языке с кодом '{language}', по одному в строке. Не нумеруй их."
+    return prompt
+
+def clean_titles(titles):
+    """Очищает ответ модели от кавычек и нумерации. Возвращает заголовки по одному в строке или None."""
+    titles = re.sub(r'["\'""]', '', titles, flags=re.MULTILINE)
+    titles = re.sub(r'^\d+\.\s*', '', titles, flags=re.MULTILINE)
+    titles = titles.strip()
+    
+    # Проверка, что получены заголовки
+    lines = [line.strip() for line in titles.split('\n') if line.strip()]
+    if not lines:
+        logging.error("После обработки не осталось заголовков")
+        return None
+    return titles
+
+def fit_content(content, hashtags, max_length):
+    """Обрезает текст поста так, чтобы вместе с хэштегами он уложился в max_length, по границе предложения."""
+    if len(content) > max_length - len(hashtags) - 2:
+        content = content[:max_length - len(hashtags) - 2]
+        last_period = content.rfind('.')
+        if last_period != -1:
+            content = content[:last_period + 1]
+    return content
+
+def split_paragraphs(content, language="en"):
+    """Делит текст поста на два абзаца по границе предложения; к одному предложению добавляет второй абзац-заглушку."""
+    sentences = content.split('. ')
+    if len(sentences) > 1:
+        mid = len(sentences) // 2
+        paragraph1 = '. '.join(sentences[:mid]).strip()
+        paragraph2 = '. '.join(sentences[mid:]).strip()
+        return f"{paragraph1}\n\n{paragraph2}"
+    if language == "ru":
+        return f"{content}\n\nПодробности скоро"
+    return f"{content}\n\nMore details coming soon"
+
+def parse_batch_posts(text, max_length=MAX_POST_LENGTH, language="en"):
+    """
+    Разбирает ответ на BATCH_PROMPT.
+    
+    Возвращает список словарей с ключами title, content, hashtags и image_prompt.
+    Записи без заголовка отбрасываются; если текст, хэштеги или промпт изображения
+    в записи некорректны, соответствующее поле равно None, и его нужно
+    сгенерировать отдельным запросом. При неразборчивом ответе возвращает None.
+    """
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        logging.error(f"В пакетном ответе нет JSON-массива: {text[:200]}...")
+        return None
+    try:
+        items = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        logging.error(f"Не удалось разобрать пакетный ответ: {e}")
+        return None
+    if not isinstance(items, list):
+        return None
+    
+    posts = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        title = item.get("title")
+        if not isinstance(title, str) or not title.strip():
+            logging.warning(f"Пропущена запись пакета без заголовка: {str(item)[:100]}")
+            continue
+        title = re.sub(r'["\'""]', '', title).replace('\n', ' ').strip()
+        
+        content = item.get("content")
+        hashtags = item.get("hashtags")
+        if isinstance(hashtags, list):
+            hashtags = " ".join(str(tag) for tag in hashtags)
+        if isinstance(content, str) and content.strip() and isinstance(hashtags, str) and '#' in hashtags:
+            hashtags = hashtags.strip()
+            content = split_paragraphs(fit_content(content.strip(), hashtags, max_length), language)
+        else:
+            logging.warning(f"Некорректный текст или хэштеги в пакете для '{title}', будет отдельный запрос")
+            content = hashtags = None
+        
+        image_prompt = item.get("image_prompt")
+        if isinstance(image_prompt, str) and len(image_prompt.strip()) >= 10:
+            image_prompt = image_prompt.strip()
+            if len(image_prompt) > 500:
+                image_prompt = image_prompt[:500].rsplit(' ', 1)[0] + '.'
+        else:
+            image_prompt = None
+        
+        posts.append({"title": title, "content": content, "hashtags": hashtags, "image_prompt": image_prompt})
+    return posts
+
 class ContentGenerator:
     """Класс для генерации контента для исторических постов."""
-    def __init__(self):
-        self.api = OpenRouterAPI()
+    def __init__(self, api=None):
+        self.api = api or OpenRouterAPI()
         self.google_ai = GoogleAI()  # Инициализируем Google AI
         self.mistral_ai = MistralAPI()  # Инициализируем Mistral AI
         self.language = "ru"  # Установим русский как язык по умолчанию
         self.post_style = "информативно-развлекательный"  # Стиль постов по умолчанию
         self.use_google_ai = False  # По умолчанию не используем Google AI
         self.use_mistral_ai = True  # По умолчанию используем Mistral AI
+        self.latency = LatencyTracker()  # Задержки провайдеров для хеджирования
+        
+    async def close(self):
+        """Освобождает сетевые ресурсы провайдеров."""
+        await self.mistral_ai.close()
+
+    async def generate_titles(self, theme, post_count, language="en", session=None, hedge=HEDGE_ENABLED, use_cache=True):
+        """
+        Генерирует заголовки постов.
+        
+        Без хеджирования заголовки запрашиваются у OpenRouter. При hedge=True
+        опрашиваются доступные провайдеры: если провайдер не ответил за время,
+        равное p95 его задержки, параллельно запрашивается следующий;
+        используется первый корректный ответ. use_cache=False запрашивает
+        у OpenRouter новые заголовки в обход кэша.
         
+        Возвращает:
+            str: Заголовки по одному в строке или None
+        """
+        if not hedge:
+            return await self.api.generate_titles(theme, post_count, language, session, use_cache=use_cache)
+        
+        prompt = build_titles_prompt(theme, post_count, language)
+        calls = []
+        if self.use_mistral_ai:
+            calls.append(("mistral", lambda: self._titles_from(self.mistral_ai.generate_text(prompt, max_tokens=1000))))
+        if self.use_google_ai:
+            calls.append(("google", lambda: self._titles_from(self.google_ai.generate_content(prompt, max_tokens=1000))))
+        calls.append(("openrouter", lambda: self.api.generate_titles(theme, post_count, language, session, use_cache=use_cache)))
+        
+        return await hedged_call(calls, self.latency, is_valid_text, hedge=hedge)
+
+    async def _titles_from(self, request):
+        """Дожидается ответа провайдера и очищает заголовки; ответ с ошибкой превращается в None."""
+        text = await request
+        if not is_valid_text(text):
+            return None
+        return clean_titles(text)
+
     async def generate_title(self, theme):
         """Генерирует заголовок для поста на историческую тему."""
         if self.use_mistral_ai:
@@ -196,36 +345,203 @@ class OpenRouterAPI:
             "User-Agent": "Telegram Bot Publikator",  # Идентификация приложения
             "X-Title": "PublikatorBot"  # Название для панели управления OpenRouter
         }
+        # Ограничение числа одновременных запросов к OpenRouter
+        self.semaphore = asyncio.Semaphore(OPENROUTER_MAX_CONCURRENCY)
+        # Кэш ответов: повторные запросы с тем же промптом не тратят квоту
+        self.cache = ResponseCache() if LLM_CACHE_ENABLED else None
+        # Одинаковые одновременные запросы выполняются одним обращением к API
+        self.flight = SingleFlight("OpenRouter")
+        # Выбор модели по задержке и ошибкам вместо фиксированного порядка
+        self.router = ModelRouter([self.PRIMARY_MODEL, self.BACKUP_MODEL, self.LAST_RESORT_MODEL])
+
+    async def generate_text(self, prompt, max_tokens=2000, session=None, use_cache=True):
+        """
+        Генерирует текст с помощью OpenRouter API.
+        
+        Ответы кэшируются по модели, промпту и параметрам; use_cache=False
+        отправляет запрос в сеть в обход кэша (новый ответ все равно сохраняется).
+        Одинаковые запросы, пришедшие одновременно, получают результат одного вызова.
+        """
+        cache_key = self._cache_key(prompt, max_tokens)
+        if self.cache is not None and use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached:
+                logging.info(f"Ответ взят из кэша, длина={len(cached)} символов")
+                return cached
+        
+        return await self.flight.do(cache_key, lambda: self._generate_and_cache(cache_key, prompt, max_tokens, session))
 
-    async def generate_text(self, prompt, max_tokens=2000, session=None):
-        """Генерирует текст с помощью OpenRouter API."""
-        # Попробуем с основной моделью
-        result = await self._try_generate_with_model(self.PRIMARY_MODEL, prompt, max_tokens, session)
-        
-        # Специальная обработка ошибки квоты
-        if result == "QUOTA_EXCEEDED":
-            logging.warning(f"Квота для модели {self.PRIMARY_MODEL} превышена, переключаемся на {self.BACKUP_MODEL}")
-            result = await self._try_generate_with_model(self.BACKUP_MODEL, prompt, max_tokens, session)
-        # Если другая ошибка или null, тоже пробуем резервную модель
-        elif result is None:
-            logging.warning(f"Основная модель {self.PRIMARY_MODEL} не сработала, пробуем резервную {self.BACKUP_MODEL}")
-            result = await self._try_generate_with_model(self.BACKUP_MODEL, prompt, max_tokens, session)
-        
-        # Если и резервная модель не сработала или также превысила квоту, попробуем третью модель
-        if result is None or result == "QUOTA_EXCEEDED":
-            logging.warning(f"Резервная модель {self.BACKUP_MODEL} не сработала, пробуем последний вариант {self.LAST_RESORT_MODEL}")
-            result = await self._try_generate_with_model(self.LAST_RESORT_MODEL, prompt, max_tokens, session)
+    def _cache_key(self, prompt, max_tokens):
+        """Ключ кэша ответа: модели, промпт и параметры генерации."""
+        return ResponseCache.make_key(
+            models=[self.PRIMARY_MODEL, self.BACKUP_MODEL, self.LAST_RESORT_MODEL],
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=0.7,
+            top_p=0.9
+        )
+
+    async def stream_text(self, prompt, max_tokens=2000, session=None):
+        """
+        Генерирует текст в потоковом режиме (SSE) и отдает его по частям.
+        
+        Модель выбирается маршрутизатором. Если модель не отдала ни одного
+        фрагмента, пробуется следующая. Если поток оборвался после начала вывода
+        (ошибка в потоке, сетевая ошибка, таймаут или закрытие без finish_reason),
+        выбрасывается StreamInterrupted: полученный текст неполный. Прекращение
+        итерации закрывает соединение, и модель перестает генерировать
+        (и расходовать) токены.
+        """
+        for model_name in self.router.candidates():
+            self.MODEL = model_name
+            started = self.router.begin(model_name)
+            received = False
+            finished = False
+            try:
+                logging.info(f"Потоковый запрос к OpenRouter API с моделью {model_name}")
+                async with self.semaphore:
+                    async with session.post(self.URL, headers=self.headers, json=self._request_data(model_name, prompt, max_tokens, stream=True), timeout=aiohttp.ClientTimeout(total=60)) as response:
+                        if response.status != 200:
+                            response_text = await response.text()
+                            logging.error(f"Ошибка OpenRouter API ({model_name}, поток): {response.status} - {response_text[:200]}")
+                            if response.status == 429:
+                                self.router.record_rate_limit(model_name, started)
+                            else:
+                                self.router.record_failure(model_name, started)
+                            continue
+                        async for event in iter_sse_json(response):
+                            if "error" in event:
+                                logging.error(f"Ошибка в потоке OpenRouter ({model_name}): {event['error']}")
+                                break
+                            text = chunk_text(event)
+                            if text:
+                                received = True
+                                yield text
+                            if finish_reason(event):
+                                finished = True
+            except (GeneratorExit, asyncio.CancelledError):
+                # Вывод прерван вызывающим кодом (например, по достижении нужной длины)
+                if received:
+                    self.router.record_success(model_name, started)
+                else:
+                    self.router.abort(model_name)
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка потоковой генерации с моделью {model_name}: {e}")
+
+            if received and finished:
+                self.router.record_success(model_name, started)
+                return
+            self.router.record_failure(model_name, started)
+            if received:
+                # Часть текста уже отдана: продолжение от другой модели не склеить
+                raise StreamInterrupted(f"Поток модели {model_name} оборвался до завершения")
+            logging.warning(f"Модель {model_name} не вернула текст в потоке, переключаемся на следующую модель")
+        
+        logging.error(f"Не удалось получить поток ни от одной модели: {self.router.snapshot()}")
+
+    async def stream_until(self, prompt, limit, on_progress, max_tokens=2000, session=None, use_cache=True):
+        """
+        Собирает потоковый ответ, показывая промежуточный текст и обрезая лишнее.
+        
+        Параметры:
+            prompt (str): Промпт
+            limit (int): Длина, после которой генерация прерывается
+            on_progress (callable): Корутина on_progress(текст), вызывается не чаще
+                чем раз в STREAM_PROGRESS_INTERVAL секунд
             
-        # Если это был "QUOTA_EXCEEDED" и для последней модели, заменим на None
-        if result == "QUOTA_EXCEEDED":
-            logging.error(f"Квота превышена для всех моделей")
+        Если поток оборвался до завершения, неполный текст отбрасывается
+        и ответ запрашивается обычным (не потоковым) запросом. use_cache=False
+        не берет ответ из кэша (см. generate_text).
+        
+        Возвращает:
+            str: Полученный текст или None
+        """
+        cache_key = self._cache_key(prompt, max_tokens)
+        if self.cache is not None and use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached:
+                logging.info(f"Ответ взят из кэша, длина={len(cached)} символов")
+                return cached
+        
+        parts = []
+        length = 0
+        truncated = False
+        loop = asyncio.get_running_loop()
+        last_progress = loop.time()
+        stream = self.stream_text(prompt, max_tokens, session)
+        try:
+            async for chunk in stream:
+                parts.append(chunk)
+                length += len(chunk)
+                if length >= limit:
+                    logging.info(f"Поток прерван по достижении {limit} символов")
+                    truncated = True
+                    break
+                if loop.time() - last_progress >= STREAM_PROGRESS_INTERVAL:
+                    last_progress = loop.time()
+                    try:
+                        await on_progress("".join(parts))
+                    except Exception as e:
+                        logging.error(f"Ошибка отображения промежуточного текста: {e}")
+        except StreamInterrupted as e:
+            logging.warning(f"{e}: повторяем запрос без потока")
+            return await self.generate_text(prompt, max_tokens=max_tokens, session=session, use_cache=use_cache)
+        finally:
+            await stream.aclose()
+        
+        text = "".join(parts).strip()
+        if not text:
             return None
-            
+        # Обрезанный ответ не кэшируем: он зависит от limit, а не только от промпта
+        if not truncated and self.cache is not None:
+            await self.cache.set(cache_key, text)
+        return text
+
+    async def _generate_and_cache(self, cache_key, prompt, max_tokens, session):
+        """Выполняет запрос к API и сохраняет успешный ответ в кэш."""
+        result = await self._generate_text(prompt, max_tokens, session)
+        if result and self.cache is not None:
+            await self.cache.set(cache_key, result)
         return result
+
+    async def _generate_text(self, prompt, max_tokens=2000, session=None):
+        """
+        Генерирует текст, выбирая модель через маршрутизатор.
+        
+        Модели перебираются от самой быстрой из доступных к самой медленной,
+        каждая получает одну попытку; отключенные модели пропускаются сразу.
+        """
+        candidates = self.router.candidates()
+        if not candidates:
+            logging.error(f"Все модели OpenRouter временно отключены: {self.router.snapshot()}")
+            return None
+        
+        for model_name in candidates:
+            self.MODEL = model_name
+            started = self.router.begin(model_name)
+            try:
+                result = await self._try_generate_with_model(model_name, prompt, max_tokens, session)
+            except asyncio.CancelledError:
+                self.router.abort(model_name)
+                raise
             
-    async def _try_generate_with_model(self, model_name, prompt, max_tokens=2000, session=None):
-        """Пытается сгенерировать текст с указанной моделью."""
-        data = {
+            if result == "QUOTA_EXCEEDED":
+                self.router.record_rate_limit(model_name, started)
+                logging.warning(f"Квота для модели {model_name} превышена, переключаемся на следующую модель")
+            elif result is None:
+                self.router.record_failure(model_name, started)
+                logging.warning(f"Модель {model_name} не сработала, переключаемся на следующую модель")
+            else:
+                self.router.record_success(model_name, started)
+                return result
+        
+        logging.error(f"Не удалось сгенерировать текст ни одной моделью: {self.router.snapshot()}")
+        return None
+            
+    def _request_data(self, model_name, prompt, max_tokens, stream=False):
+        """Тело запроса к chat/completions."""
+        return {
             "model": model_name,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
@@ -233,108 +549,106 @@ class OpenRouterAPI:
             "top_p": 0.9,
             "frequency_penalty": 0,
             "presence_penalty": 0,
-            "stream": False,
+            "stream": stream,
             "response_format": {"type": "text"}
         }
-        for attempt in range(3):  # Уменьшаем количество попыток для каждой модели
-            try:
-                logging.info(f"Отправка запроса к OpenRouter API с моделью {model_name} (попытка {attempt + 1})")
+
+    async def _try_generate_with_model(self, model_name, prompt, max_tokens=2000, session=None):
+        """Выполняет один запрос к указанной модели. Возвращает текст, "QUOTA_EXCEEDED" или None."""
+        data = self._request_data(model_name, prompt, max_tokens)
+        try:
+            logging.info(f"Отправка запроса к OpenRouter API с моделью {model_name}")
+            async with self.semaphore:
                 async with session.post(self.URL, headers=self.headers, json=data, timeout=aiohttp.ClientTimeout(total=60)) as response:
                     response_text = await response.text()
-                    
-                    # Если получили ошибку квоты (429), сразу прекращаем попытки с этой моделью
-                    if response.status == 429 or ("error" in response_text and "429" in response_text):
-                        logging.error(f"Ошибка превышения квоты (429) для модели {model_name}: {response_text[:200]}...")
-                        # Возвращаем особый статус для обработки в вызывающем методе
-                        return "QUOTA_EXCEEDED"
-                        
-                    if response.status != 200:
-                        logging.error(f"Ошибка OpenRouter API (попытка {attempt + 1}): {response.status} - {response_text}")
-                        await asyncio.sleep(5 * (attempt + 1))
-                        continue
-                    
-                    try:
-                        result = json.loads(response_text)
-                        logging.info(f"Ответ от OpenRouter API получен, структура: {list(result.keys())}")
-                    except json.JSONDecodeError as e:
-                        logging.error(f"Не удалось разобрать JSON-ответ: {e}. Полный ответ: {response_text[:200]}...")
-                        await asyncio.sleep(5 * (attempt + 1))
-                        continue
-                    
-                    # Проверка на ошибку 429 внутри JSON-ответа
-                    if "error" in result and ("code" in result["error"] and result["error"]["code"] == 429):
-                        logging.error(f"Ошибка превышения квоты (429) в ответе JSON для модели {model_name}")
-                        return "QUOTA_EXCEEDED"
-                    
-                    # Проверяем корректную структуру ответа
-                    if "choices" not in result:
-                        logging.error(f"Неожиданная структура ответа от OpenRouter API: {result}")
-                        await asyncio.sleep(5 * (attempt + 1))
-                        continue
-                    
-                    if not result["choices"] or "message" not in result["choices"][0]:
-                        logging.error(f"Пустой список choices или отсутствует message: {result}")
-                        await asyncio.sleep(5 * (attempt + 1))
-                        continue
-                    
-                    generated_text = result["choices"][0]["message"]["content"].strip()
-                    logging.info(f"Сгенерирован текст, длина={len(generated_text)} символов")
-                    
-                    # Если текст пустой, повторим попытку
-                    if not generated_text:
-                        logging.error("Получен пустой ответ от модели")
-                        await asyncio.sleep(5 * (attempt + 1))
-                        continue
-                        
-                    return generated_text
-            except Exception as e:
-                error_traceback = traceback.format_exc()
-                logging.error(f"Ошибка генерации текста с моделью {model_name} (попытка {attempt + 1}): {e}\n{error_traceback}")
-                await asyncio.sleep(5 * (attempt + 1))
-        
-        logging.error(f"Не удалось сгенерировать текст с моделью {model_name} после всех попыток")
-        return None
+                    status = response.status
+
+            # Если получили ошибку квоты (429), модель отключается на время охлаждения
+            if status == 429 or ("error" in response_text and "429" in response_text):
+                logging.error(f"Ошибка превышения квоты (429) для модели {model_name}: {response_text[:200]}...")
+                # Возвращаем особый статус для обработки в вызывающем методе
+                return "QUOTA_EXCEEDED"
+
+            if status != 200:
+                logging.error(f"Ошибка OpenRouter API ({model_name}): {status} - {response_text}")
+                return None
+
+            try:
+                result = json.loads(response_text)
+                logging.info(f"Ответ от OpenRouter API получен, структура: {list(result.keys())}")
+            except json.JSONDecodeError as e:
+                logging.error(f"Не удалось разобрать JSON-ответ: {e}. Полный ответ: {response_text[:200]}...")
+                return None
+
+            # Проверка на ошибку 429 внутри JSON-ответа
+            if "error" in result and ("code" in result["error"] and result["error"]["code"] == 429):
+                logging.error(f"Ошибка превышения квоты (429) в ответе JSON для модели {model_name}")
+                return "QUOTA_EXCEEDED"
+
+            # Проверяем корректную структуру ответа
+            if "choices" not in result:
+                logging.error(f"Неожиданная структура ответа от OpenRouter API: {result}")
+                return None
+
+            if not result["choices"] or "message" not in result["choices"][0]:
+                logging.error(f"Пустой список choices или отсутствует message: {result}")
+                return None
+
+            generated_text = result["choices"][0]["message"]["content"].strip()
+            logging.info(f"Сгенерирован текст, длина={len(generated_text)} символов")
+
+            if not generated_text:
+                logging.error("Получен пустой ответ от модели")
+                return None
+
+            return generated_text
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error_traceback = traceback.format_exc()
+            logging.error(f"Ошибка генерации текста с моделью {model_name}: {e}\n{error_traceback}")
+            return None
 
-    async def generate_titles(self, theme, post_count, language="en", session=None):
-        """Генерирует заголовки постов."""
+    async def generate_titles(self, theme, post_count, language="en", session=None, use_cache=True):
+        """Генерирует заголовки постов. use_cache=False запрашивает новые заголовки в обход кэша."""
         logging.info(f"Генерация заголовков на языке: {language}")
-        if language not in TITLE_PROMPT:
-            language = "en"
-        prompt = TITLE_PROMPT[language].format(post_count=post_count, theme=theme)
-        
-        # Добавляем инструкции для модели по формату и количеству
-        prompt += f"\n\nВажно: генерируй ровно {post_count} заголовков, по одному в строке. Не нумеруй их."
+        prompt = build_titles_prompt(theme, post_count, language)
         
-        titles = await self.generate_text(prompt, max_tokens=1000, session=session)
+        titles = await self.generate_text(prompt, max_tokens=1000, session=session, use_cache=use_cache)
         if not titles:
             logging.error("Получен пустой ответ при генерации заголовков")
             return None
             
         # Обработка и очистка заголовков
-        titles = re.sub(r'["\'""]', '', titles, flags=re.MULTILINE)
-        titles = re.sub(r'^\d+\.\s*', '', titles, flags=re.MULTILINE)
-        titles = titles.strip()
-        
-        # Проверка, что получены заголовки
-        lines = [line.strip() for line in titles.split('\n') if line.strip()]
-        if not lines:
-            logging.error("После обработки не осталось заголовков")
+        titles = clean_titles(titles)
+        if not titles:
             return None
             
+        lines = [line.strip() for line in titles.split('\n') if line.strip()]
         logging.info(f"Сгенерировано заголовков: {len(lines)}")
         return titles
 
-    async def generate_post_content(self, title, theme, style, max_length=MAX_POST_LENGTH, language="en", session=None):
-        """Генерирует контент поста и хэштеги."""
+    async def generate_post_content(self, title, theme, style, max_length=MAX_POST_LENGTH, language="en", session=None, on_progress=None, use_cache=True):
+        """
+        Генерирует контент поста и хэштеги.
+        
+        Если передан on_progress, текст запрашивается потоком: промежуточный
+        текст передается в on_progress, а генерация прерывается, как только
+        набрано max_length символов плюс запас на хэштеги. Если хэштеги
+        в ответ не попали (например, поток прерван раньше), они запрашиваются
+        отдельно. use_cache=False запрашивает новый текст в обход кэша.
+        """
         logging.info(f"Генерация контента для '{title}' на языке: {language}")
-        if language not in POST_PROMPT:
-            language = "en"
-        prompt = POST_PROMPT[language].format(title=title, theme=theme, style=style, max_length=max_length)
+        # POST_PROMPT — общий шаблон для всех языков
+        prompt = POST_PROMPT.format(title=title, theme=theme, style=style, max_length=max_length)
         
         # Добавляем инструкции
         prompt += f"\n\nВажно: придерживайся длины {max_length} символов и структуры с 2 абзацами и 3 хэштегами. Не используй заголовок в тексте."
         
-        post_content = await self.generate_text(prompt, max_tokens=2000, session=session)
+        if on_progress is None:
+            post_content = await self.generate_text(prompt, max_tokens=2000, session=session, use_cache=use_cache)
+        else:
+            post_content = await self.stream_until(prompt, max_length + STREAM_HASHTAG_RESERVE, on_progress, max_tokens=2000, session=session, use_cache=use_cache)
         if not post_content:
             logging.error("Получен пустой ответ при генерации контента поста")
             return None
@@ -358,32 +672,20 @@ class OpenRouterAPI:
                     hashtags = content_parts[-1]
                     content = '\n\n'.join(content_parts[:-1])
                 else:
-                    # Если хэштегов нет, добавляем стандартные
-                    if language == "ru":
-                        hashtags = "#история #события #девяностые"
-                    else:
-                        hashtags = "#history #events #nineties"
-                    logging.warning(f"Неправильный формат для '{title}', добавлены стандартные хэштеги")
+                    # Хэштегов нет: запрашиваем их отдельно, стандартные — только если и это не удалось
+                    hashtags = await self.generate_hashtags(title, theme, language, session, use_cache)
+                    if not hashtags:
+                        if language == "ru":
+                            hashtags = "#история #события #девяностые"
+                        else:
+                            hashtags = "#history #events #nineties"
+                        logging.warning(f"Не удалось получить хэштеги для '{title}', добавлены стандартные")
             
             # Ограничение длины контента
-            if len(content) > max_length - len(hashtags) - 2:
-                content = content[:max_length - len(hashtags) - 2]
-                last_period = content.rfind('.')
-                if last_period != -1:
-                    content = content[:last_period + 1]
+            content = fit_content(content, hashtags, max_length)
     
             # Форматирование на параграфы
-            sentences = content.split('. ')
-            if len(sentences) > 1:
-                mid = len(sentences) // 2
-                paragraph1 = '. '.join(sentences[:mid]).strip()
-                paragraph2 = '. '.join(sentences[mid:]).strip()
-                content = f"{paragraph1}\n\n{paragraph2}"
-            else:
-                if language == "ru":
-                    content = f"{content}\n\nПодробности скоро"
-                else:
-                    content = f"{content}\n\nMore details coming soon"
+            content = split_paragraphs(content, language)
     
             # Формируем финальный результат
             formatted_post = f"{content}\n\n{hashtags}"
@@ -394,17 +696,55 @@ class OpenRouterAPI:
             logging.error(f"Ошибка обработки контента для '{title}': {e}")
             return None
 
-    async def generate_image_prompt(self, title, theme, language="en", session=None):
-        """Генерирует промпт для изображения."""
+    async def generate_hashtags(self, title, theme, language="en", session=None, use_cache=True):
+        """
+        Запрашивает 3 хэштега для поста отдельным коротким запросом.
+        
+        Возвращает:
+            str: Хэштеги через пробел или None, если получить их не удалось
+        """
+        prompt = HASHTAG_PROMPT.format(title=title, theme=theme, language=language)
+        response = await self.generate_text(prompt, max_tokens=100, session=session, use_cache=use_cache)
+        hashtags = re.findall(r"#\w+", response or "")[:3]
+        if not hashtags:
+            logging.error(f"Не удалось получить хэштеги для '{title}': {response}")
+            return None
+        logging.info(f"Хэштеги для '{title}' получены отдельным запросом: {' '.join(hashtags)}")
+        return " ".join(hashtags)
+
+    async def generate_batch_posts(self, theme, post_count, style, max_length=MAX_POST_LENGTH, language="en", session=None, use_cache=True):
+        """
+        Генерирует заголовки, тексты, хэштеги и промпты изображений всех постов одним запросом.
+        
+        Возвращает:
+            list: Записи поста (см. parse_batch_posts) или None, если ответ не удалось получить или разобрать
+        """
+        logging.info(f"Пакетная генерация {post_count} постов на языке: {language}")
+        prompt = BATCH_PROMPT.format(post_count=post_count, theme=theme, style=style, max_length=max_length, language=language)
+        # Примерно 600 токенов на пост: текст, хэштеги и промпт изображения
+        max_tokens = min(600 * post_count + 500, 16000)
+        
+        response = await self.generate_text(prompt, max_tokens=max_tokens, session=session, use_cache=use_cache)
+        if not response:
+            logging.error("Получен пустой ответ при пакетной генерации")
+            return None
+        
+        posts = parse_batch_posts(response, max_length, language)
+        if not posts:
+            return None
+        logging.info(f"Пакетная генерация: получено {len(posts)} из {post_count} постов")
+        return posts[:post_count]
+
+    async def generate_image_prompt(self, title, theme, language="en", session=None, use_cache=True):
+        """Генерирует промпт для изображения. use_cache=False запрашивает новый промпт в обход кэша."""
         logging.info(f"Генерация описания изображения для '{title}' на языке: {language}")
-        if language not in IMAGE_PROMPT:
-            language = "en"
-        prompt = IMAGE_PROMPT[language].format(title=title, theme=theme)
+        # IMAGE_PROMPT — общий шаблон для всех языков
+        prompt = IMAGE_PROMPT.format(title=title, theme=theme)
         
         # Дополнительные инструкции для создания качественного промпта
         prompt += "\n\nВажно: создай четкий, фотореалистичный промпт. Не включай запрещенный контент."
         
-        image_prompt = await self.generate_text(prompt, max_tokens=200, session=session)
+        image_prompt = await self.generate_text(prompt, max_tokens=200, session=session, use_cache=use_cache)
         if not image_prompt:
             logging.error(f"Не удалось сгенерировать промпт для изображения '{title}'")
             if language == "ru":
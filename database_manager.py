@@ -1,149 +1,467 @@
 import sqlite3
+import json
 import logging
 from datetime import datetime, timezone, timedelta  # Убедимся, что timedelta импортирован
 import asyncio
 import aiosqlite
+from config import USAGE_STATS_BATCH_SIZE, USAGE_STATS_FLUSH_INTERVAL, SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL
+from ttl_cache import TTLCache, MISSING
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
 DB_PATH = "telegram_bot_data.db"
 
-async def setup_database():
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS clients (
-                chat_id INTEGER PRIMARY KEY,
-                theme TEXT,
-                post_count INTEGER,
-                style TEXT,
-                channel_id TEXT,
-                subscription_end TEXT,
-                subscription_plan TEXT,
-                language TEXT
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS posts (
-                chat_id INTEGER,
-                post_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                content TEXT,
-                hashtags TEXT,
-                file_id TEXT,
-                image_prompt TEXT,
-                message_id INTEGER,
-                created_at TEXT,
-                FOREIGN KEY (chat_id) REFERENCES clients(chat_id)
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS schedule (
-                chat_id INTEGER,
-                post_id INTEGER,
-                channel_id TEXT,
-                publish_datetime TEXT,
-                FOREIGN KEY (chat_id) REFERENCES clients(chat_id),
-                FOREIGN KEY (post_id) REFERENCES posts(post_id)
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS usage_stats (
-                chat_id INTEGER,
-                action TEXT,
-                timestamp TEXT,
-                FOREIGN KEY (chat_id) REFERENCES clients(chat_id)
-            )
-        """)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_chat_created ON posts(chat_id, created_at)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_usage_stats_chat ON usage_stats(chat_id)")
+# Общее соединение с базой на весь процесс: одно фоновое соединение aiosqlite
+# вместо нового потока и fsync на каждый запрос
+_connection = None
+_connection_lock = asyncio.Lock()
+
+# Настройки SQLite для долгоживущего соединения
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # Читатели не блокируют писателя
+    "PRAGMA synchronous=NORMAL",    # В режиме WAL безопасно и без fsync на каждый коммит
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",      # ~8 МБ кэша страниц
+)
+
+async def get_connection():
+    """Возвращает общее соединение с базой данных, открывая его при первом обращении."""
+    global _connection
+    if _connection is None:
+        async with _connection_lock:
+            if _connection is None:
+                # cached_statements — кэш подготовленных выражений sqlite3
+                db = await aiosqlite.connect(DB_PATH, timeout=30.0, cached_statements=256)
+                for pragma in PRAGMAS:
+                    await db.execute(pragma)
+                _connection = db
+                logging.info(f"Открыто соединение с базой {DB_PATH} (WAL)")
+    return _connection
+
+async def ping_database():
+    """Проверяет, что база данных отвечает на запросы."""
+    db = await get_connection()
+    async with db.execute("SELECT 1") as cursor:
+        await cursor.fetchone()
+
+async def close_database():
+    """Сбрасывает буферы и закрывает общее соединение с базой данных."""
+    global _connection, _usage_flush_task
+    if _usage_flush_task is not None and not _usage_flush_task.done():
+        _usage_flush_task.cancel()
+    _usage_flush_task = None
+    await flush_usage_stats()
+    if _connection is not None:
+        db, _connection = _connection, None
         await db.commit()
-        logging.info(f"Database initialized at {DB_PATH} with all tables")
+        await db.close()
+        logging.info("Соединение с базой данных закрыто")
+
+async def setup_database():
+    db = await get_connection()
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS clients (
+            chat_id INTEGER PRIMARY KEY,
+            theme TEXT,
+            post_count INTEGER,
+            style TEXT,
+            channel_id TEXT,
+            subscription_end TEXT,
+            subscription_plan TEXT,
+            language TEXT
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            chat_id INTEGER,
+            post_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            content TEXT,
+            hashtags TEXT,
+            file_id TEXT,
+            image_prompt TEXT,
+            message_id INTEGER,
+            created_at TEXT,
+            FOREIGN KEY (chat_id) REFERENCES clients(chat_id)
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schedule (
+            chat_id INTEGER,
+            post_id INTEGER,
+            channel_id TEXT,
+            publish_datetime TEXT,
+            FOREIGN KEY (chat_id) REFERENCES clients(chat_id),
+            FOREIGN KEY (post_id) REFERENCES posts(post_id)
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS usage_stats (
+            chat_id INTEGER,
+            action TEXT,
+            timestamp TEXT,
+            FOREIGN KEY (chat_id) REFERENCES clients(chat_id)
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS chat_state (
+            chat_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at TEXT  -- Последняя активность чата: изменение состояния или обновление от него
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_at TEXT,
+            last_access TEXT
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS image_cache (
+            key TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            file_id TEXT,
+            created_at TEXT,
+            last_access TEXT
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_chat_created ON posts(chat_id, created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_chat_state_updated ON chat_state(updated_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_image_cache_access ON image_cache(last_access)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_usage_stats_chat ON usage_stats(chat_id)")
+    await db.commit()
+    logging.info(f"Database initialized at {DB_PATH} with all tables")
+    await rebuild_post_counters()
+
+CLIENT_COLUMNS = ['chat_id', 'theme', 'post_count', 'style', 'channel_id', 'subscription_end', 'subscription_plan', 'language']
+
+# Кэш настроек клиентов (chat_id -> dict или None, если клиента нет в базе).
+# Поддерживается в актуальном состоянии через save_client_settings
+_settings_cache = TTLCache(SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL)
+_settings_writes = 0  # Счетчик записей: чтение, пересекшееся с записью, не кладется в кэш
 
 async def save_client_settings(chat_id, **kwargs):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        fields = ', '.join(kwargs.keys())
-        placeholders = ', '.join(['?' for _ in kwargs])
-        values = list(kwargs.values())
-        await db.execute(f"""
-            INSERT OR REPLACE INTO clients (chat_id, {fields})
-            VALUES (?, {placeholders})
-        """, [chat_id] + values)
-        await db.commit()
+    global _settings_writes
+    _settings_writes += 1
+    db = await get_connection()
+    fields = ', '.join(kwargs.keys())
+    placeholders = ', '.join(['?' for _ in kwargs])
+    updates = ', '.join(f"{field} = excluded.{field}" for field in kwargs)
+    values = list(kwargs.values())
+    # Обновляем только переданные поля, остальные настройки клиента сохраняются
+    await db.execute(f"""
+        INSERT INTO clients (chat_id, {fields})
+        VALUES (?, {placeholders})
+        ON CONFLICT(chat_id) DO UPDATE SET {updates}
+    """, [chat_id] + values)
+    await db.commit()
+
+    cached = _settings_cache.get(chat_id)
+    if cached is MISSING:
+        return
+    if cached is None:
+        cached = dict.fromkeys(CLIENT_COLUMNS)
+        cached['chat_id'] = chat_id
+    _settings_cache.set(chat_id, {**cached, **kwargs})
 
 async def get_client_settings(chat_id):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        async with db.execute("SELECT * FROM clients WHERE chat_id = ?", (chat_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return dict(zip(['chat_id', 'theme', 'post_count', 'style', 'channel_id', 'subscription_end', 'subscription_plan', 'language'], row))
-            return None
+    cached = _settings_cache.get(chat_id)
+    if cached is not MISSING:
+        return dict(cached) if cached is not None else None
+
+    writes_before = _settings_writes
+    db = await get_connection()
+    async with db.execute("SELECT * FROM clients WHERE chat_id = ?", (chat_id,)) as cursor:
+        row = await cursor.fetchone()
+    settings = dict(zip(CLIENT_COLUMNS, row)) if row else None
+    if writes_before == _settings_writes:
+        _settings_cache.set(chat_id, settings)
+    return dict(settings) if settings is not None else None
+
+# Счетчики постов за текущий месяц (chat_id -> количество). Строятся из таблицы
+# posts при запуске и увеличиваются в save_post_result, поэтому проверка квоты
+# не зависит от размера истории постов
+_monthly_post_counts = {}
+_counts_month = None  # (год, месяц), для которого посчитаны счетчики
+_counts_lock = asyncio.Lock()
+
+def _month_start():
+    return datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+async def rebuild_post_counters():
+    """Пересчитывает счетчики постов за текущий месяц по таблице posts."""
+    global _counts_month
+    async with _counts_lock:
+        first_day = _month_start()
+        db = await get_connection()
+        async with db.execute("""
+            SELECT chat_id, COUNT(*) FROM posts
+            WHERE created_at >= ?
+            GROUP BY chat_id
+        """, (first_day.isoformat(),)) as cursor:
+            rows = await cursor.fetchall()
+        _monthly_post_counts.clear()
+        _monthly_post_counts.update(rows)
+        _counts_month = (first_day.year, first_day.month)
+    logging.info(f"Счетчики постов за месяц пересчитаны: {len(rows)} клиентов")
 
 async def save_post_result(chat_id, title, content, hashtags, file_id, image_prompt, message_id):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
+    db = await get_connection()
+    async with _counts_lock:
+        created_at = datetime.now(timezone.utc)
         await db.execute("""
             INSERT INTO posts (chat_id, title, content, hashtags, file_id, image_prompt, message_id, created_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (chat_id, title, content, hashtags, file_id, image_prompt, message_id, datetime.now(timezone.utc).isoformat()))
+        """, (chat_id, title, content, hashtags, file_id, image_prompt, message_id, created_at.isoformat()))
         await db.commit()
+        if _counts_month == (created_at.year, created_at.month):
+            _monthly_post_counts[chat_id] = _monthly_post_counts.get(chat_id, 0) + 1
+
+async def get_recent_post_ids(chat_id, limit):
+    db = await get_connection()
+    async with db.execute("""
+        SELECT post_id FROM posts
+        WHERE chat_id = ?
+        ORDER BY created_at DESC
+        LIMIT ?
+    """, (chat_id, limit)) as cursor:
+        return [row[0] for row in await cursor.fetchall()]
 
 async def get_pending_posts():
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        async with db.execute("""
-            SELECT c.chat_id, s.post_id, s.channel_id, s.publish_datetime, p.message_id
-            FROM schedule s
-            JOIN clients c ON s.chat_id = c.chat_id
-            JOIN posts p ON s.post_id = p.post_id
-            WHERE s.publish_datetime <= ?
-        """, (datetime.now(timezone.utc).isoformat(),)) as cursor:
-            return await cursor.fetchall()
-
-async def delete_schedule_entry(chat_id, post_id):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
+    db = await get_connection()
+    async with db.execute("""
+        SELECT c.chat_id, s.post_id, s.channel_id, s.publish_datetime, p.message_id,
+               p.title, p.content, p.hashtags, p.file_id
+        FROM schedule s
+        JOIN clients c ON s.chat_id = c.chat_id
+        JOIN posts p ON s.post_id = p.post_id
+        WHERE s.publish_datetime <= ?
+    """, (datetime.now(timezone.utc).isoformat(),)) as cursor:
+        return await cursor.fetchall()
+
+async def delete_schedule_entry(chat_id, post_id, channel_id=None):
+    """Удаляет запись расписания поста: для одного канала или, без channel_id, для всех."""
+    db = await get_connection()
+    if channel_id is None:
         await db.execute("DELETE FROM schedule WHERE chat_id = ? AND post_id = ?", (chat_id, post_id))
-        await db.commit()
+    else:
+        await db.execute("DELETE FROM schedule WHERE chat_id = ? AND post_id = ? AND channel_id = ?", (chat_id, post_id, channel_id))
+    await db.commit()
 
 async def get_post_count_this_month(chat_id):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        first_day = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        async with db.execute("""
-            SELECT COUNT(*) FROM posts
-            WHERE chat_id = ? AND created_at >= ?
-        """, (chat_id, first_day.isoformat())) as cursor:
-            count = await cursor.fetchone()
-            return count[0] if count else 0
+    first_day = _month_start()
+    if _counts_month != (first_day.year, first_day.month):
+        # Первый запрос после запуска или в новом месяце
+        await rebuild_post_counters()
+    return _monthly_post_counts.get(chat_id, 0)
 
 async def save_schedule(chat_id, channel_id, post_id, publish_datetime):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        await db.execute("""
-            INSERT INTO schedule (chat_id, post_id, channel_id, publish_datetime)
-            VALUES (?, ?, ?, ?)
-        """, (chat_id, post_id, channel_id, publish_datetime.isoformat()))
-        await db.commit()
+    db = await get_connection()
+    await db.execute("""
+        INSERT INTO schedule (chat_id, post_id, channel_id, publish_datetime)
+        VALUES (?, ?, ?, ?)
+    """, (chat_id, post_id, channel_id, publish_datetime.isoformat()))
+    await db.commit()
 
 async def clean_old_posts(days=7):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-        await db.execute("""
-            DELETE FROM posts WHERE created_at < ?
-        """, (cutoff.isoformat(),))
-        await db.commit()
+    """
+    Удаляет посты старше days дней. Посты текущего месяца сохраняются: по ним
+    считается месячная квота (rebuild_post_counters после перезапуска).
+    """
+    db = await get_connection()
+    cutoff = min(datetime.now(timezone.utc) - timedelta(days=days), _month_start())
+    await db.execute("""
+        DELETE FROM posts WHERE created_at < ?
+    """, (cutoff.isoformat(),))
+    await db.commit()
     logging.info(f"Cleaned posts older than {days} days")
 
+# Отложенная запись статистики: события копятся в памяти и пишутся одной
+# транзакцией по достижении размера пакета, по таймеру или при остановке
+_usage_buffer = []
+_usage_flush_task = None
+
 async def save_usage_stat(chat_id, action, timestamp=None):
+    global _usage_flush_task
     timestamp = timestamp or datetime.now(timezone.utc).isoformat()
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        await db.execute("""
+    _usage_buffer.append((chat_id, action, timestamp))
+    if len(_usage_buffer) >= USAGE_STATS_BATCH_SIZE:
+        try:
+            await flush_usage_stats()
+        except Exception as e:
+            # События остаются в буфере и запишутся со следующим пакетом
+            logging.error(f"Ошибка записи статистики использования: {e}")
+    elif _usage_flush_task is None or _usage_flush_task.done():
+        _usage_flush_task = asyncio.create_task(_flush_usage_stats_later())
+
+async def _flush_usage_stats_later():
+    await asyncio.sleep(USAGE_STATS_FLUSH_INTERVAL)
+    try:
+        await flush_usage_stats()
+    except Exception as e:
+        logging.error(f"Ошибка записи статистики использования: {e}")
+
+async def flush_usage_stats():
+    """Записывает накопленные события статистики в таблицу usage_stats."""
+    if not _usage_buffer:
+        return
+    batch = _usage_buffer[:]
+    _usage_buffer.clear()
+    try:
+        db = await get_connection()
+        await db.executemany("""
             INSERT INTO usage_stats (chat_id, action, timestamp)
             VALUES (?, ?, ?)
-        """, (chat_id, action, timestamp))
+        """, batch)
         await db.commit()
+    except Exception:
+        # Возвращаем события в буфер, чтобы не потерять их при временной ошибке
+        _usage_buffer[:0] = batch
+        raise
+
+def database_stats():
+    """Счетчики для метрик: попадания в кэш настроек и незаписанные события статистики."""
+    return {
+        "settings_cache_hits": _settings_cache.hits,
+        "settings_cache_misses": _settings_cache.misses,
+        "usage_stats_pending": len(_usage_buffer),
+    }
 
 async def get_usage_stats(chat_id, days=30):
-    async with aiosqlite.connect(DB_PATH, timeout=30.0) as db:
-        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-        async with db.execute("""
-            SELECT action, COUNT(*), MAX(timestamp) FROM usage_stats
-            WHERE chat_id = ? AND timestamp >= ?
-            GROUP BY action
-        """, (chat_id, cutoff.isoformat())) as cursor:
-            return await cursor.fetchall()
\ No newline at end of file
+    await flush_usage_stats()
+    db = await get_connection()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    async with db.execute("""
+        SELECT action, COUNT(*), MAX(timestamp) FROM usage_stats
+        WHERE chat_id = ? AND timestamp >= ?
+        GROUP BY action
+    """, (chat_id, cutoff.isoformat())) as cursor:
+        return await cursor.fetchall()
+
+async def load_chat_state(chat_id):
+    db = await get_connection()
+    async with db.execute("SELECT data FROM chat_state WHERE chat_id = ?", (chat_id,)) as cursor:
+        row = await cursor.fetchone()
+    return json.loads(row[0]) if row else None
+
+async def save_chat_states(states):
+    """Сохраняет состояния чатов одной транзакцией. Пустые состояния удаляются."""
+    updated_at = datetime.now(timezone.utc).isoformat()
+    to_save = [(chat_id, json.dumps(state, ensure_ascii=False), updated_at) for chat_id, state in states.items() if state]
+    to_delete = [(chat_id,) for chat_id, state in states.items() if not state]
+    db = await get_connection()
+    if to_save:
+        await db.executemany("""
+            INSERT OR REPLACE INTO chat_state (chat_id, data, updated_at)
+            VALUES (?, ?, ?)
+        """, to_save)
+    if to_delete:
+        await db.executemany("DELETE FROM chat_state WHERE chat_id = ?", to_delete)
+    await db.commit()
+
+async def touch_chat_states(chat_ids):
+    """Отмечает активность чатов, состояние которых не менялось, чтобы оно не устарело."""
+    updated_at = datetime.now(timezone.utc).isoformat()
+    db = await get_connection()
+    await db.executemany("UPDATE chat_state SET updated_at = ? WHERE chat_id = ?", [(updated_at, chat_id) for chat_id in chat_ids])
+    await db.commit()
+
+async def delete_stale_chat_states(days):
+    """Удаляет состояния чатов, не проявлявших активности больше days дней."""
+    db = await get_connection()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    cursor = await db.execute("DELETE FROM chat_state WHERE updated_at < ?", (cutoff.isoformat(),))
+    await db.commit()
+    return cursor.rowcount
+
+async def checkpoint_database():
+    """Переносит WAL в основной файл базы и обрезает журнал."""
+    db = await get_connection()
+    await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+async def get_cached_response(key, max_age_seconds):
+    """Возвращает (ответ, время создания) не старше max_age_seconds или None."""
+    db = await get_connection()
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=max_age_seconds)
+    async with db.execute("""
+        SELECT response, created_at FROM llm_cache
+        WHERE key = ? AND created_at >= ?
+    """, (key, cutoff.isoformat())) as cursor:
+        row = await cursor.fetchone()
+    if not row:
+        return None
+    await db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now.isoformat(), key))
+    await db.commit()
+    return row[0], datetime.fromisoformat(row[1])
+
+async def save_cached_response(key, response):
+    db = await get_connection()
+    now = datetime.now(timezone.utc).isoformat()
+    await db.execute("""
+        INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_access)
+        VALUES (?, ?, ?, ?)
+    """, (key, response, now, now))
+    await db.commit()
+
+async def evict_cached_responses(max_entries, max_age_seconds):
+    """Удаляет устаревшие ответы и самые давно использованные сверх лимита."""
+    db = await get_connection()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    await db.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff.isoformat(),))
+    await db.execute("""
+        DELETE FROM llm_cache WHERE key NOT IN (
+            SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT ?
+        )
+    """, (max_entries,))
+    await db.commit()
+
+async def get_cached_image(key):
+    """Возвращает (size, file_id) изображения из кэша или None."""
+    db = await get_connection()
+    async with db.execute("SELECT size, file_id FROM image_cache WHERE key = ?", (key,)) as cursor:
+        row = await cursor.fetchone()
+    if not row:
+        return None
+    await db.execute("UPDATE image_cache SET last_access = ? WHERE key = ?", (datetime.now(timezone.utc).isoformat(), key))
+    await db.commit()
+    return row
+
+async def save_cached_image(key, size):
+    db = await get_connection()
+    now = datetime.now(timezone.utc).isoformat()
+    await db.execute("""
+        INSERT OR REPLACE INTO image_cache (key, size, file_id, created_at, last_access)
+        VALUES (?, ?, NULL, ?, ?)
+    """, (key, size, now, now))
+    await db.commit()
+
+async def set_cached_image_file_id(key, file_id):
+    db = await get_connection()
+    await db.execute("UPDATE image_cache SET file_id = ? WHERE key = ?", (file_id, key))
+    await db.commit()
+
+async def delete_cached_image(key):
+    db = await get_connection()
+    await db.execute("DELETE FROM image_cache WHERE key = ?", (key,))
+    await db.commit()
+
+async def evict_cached_images(max_bytes):
+    """Удаляет самые давно использованные изображения, пока общий размер больше max_bytes. Возвращает удаленные ключи."""
+    db = await get_connection()
+    async with db.execute("SELECT key, size FROM image_cache ORDER BY last_access DESC") as cursor:
+        rows = await cursor.fetchall()
+    total = 0
+    evicted = []
+    for key, size in rows:
+        total += size
+        if total > max_bytes:
+            evicted.append((key,))
+    if evicted:
+        await db.executemany("DELETE FROM image_cache WHERE key = ?", evicted)
+        await db.commit()
+    return [key for key, in evicted]
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import traceback
+from collections import deque
+from config import MAX_CONCURRENT_CHATS, CHAT_QUEUE_SIZE, DISPATCH_OVERFLOW_LIMIT
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class UpdateDispatcher:
+    """
+    Диспетчер обновлений Telegram.
+
+    Обновления одного чата обрабатываются строго по порядку, а разные чаты
+    обслуживаются параллельно отдельными задачами asyncio. Общее число
+    одновременно обрабатываемых обновлений ограничено семафором, а очередь
+    каждого чата имеет ограниченный размер. Обновления сверх очереди чата
+    ждут в его списке переполнения; общий размер этих списков ограничен,
+    поэтому один занятый чат не задерживает и не вытесняет остальные.
+    """
+    def __init__(self, handler, max_concurrency=MAX_CONCURRENT_CHATS, queue_size=CHAT_QUEUE_SIZE,
+                 max_overflow=DISPATCH_OVERFLOW_LIMIT):
+        """
+        Параметры:
+            handler (callable): Корутина handler(chat_id, update), обрабатывающая одно обновление
+            max_concurrency (int): Максимальное число одновременно обрабатываемых чатов
+            queue_size (int): Максимальная длина очереди обновлений одного чата
+            max_overflow (int): Сколько обновлений сверх очередей может ждать во всех чатах вместе
+        """
+        self.handler = handler
+        self.queue_size = queue_size
+        self.max_overflow = max_overflow
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.queues = {}    # chat_id -> asyncio.Queue
+        self.overflow = {}  # chat_id -> deque обновлений, не поместившихся в очередь
+        self.overflow_size = 0
+        self.workers = {}   # chat_id -> asyncio.Task
+
+    def dispatch(self, chat_id, update):
+        """
+        Ставит обновление в очередь чата, не дожидаясь места в ней.
+        Возвращает False, если очередь чата заполнена, а общий лимит переполнения исчерпан.
+        """
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            self.queues[chat_id] = queue
+        overflow = self.overflow.get(chat_id)
+        if overflow is None and not queue.full():
+            queue.put_nowait(update)
+        elif self.overflow_size < self.max_overflow:
+            # Порядок сохраняется: пока у чата есть переполнение, новые обновления идут следом
+            if overflow is None:
+                overflow = self.overflow[chat_id] = deque()
+                logging.warning(f"Очередь чата {chat_id} заполнена ({self.queue_size}), обновления ждут в переполнении")
+            overflow.append(update)
+            self.overflow_size += 1
+        else:
+            logging.warning(f"Лимит переполнения ({self.max_overflow}) исчерпан, обновление {update.get('update_id')} для chat_id={chat_id} не принято")
+            if queue.empty() and chat_id not in self.workers:
+                self.queues.pop(chat_id, None)
+            return False
+
+        if chat_id not in self.workers:
+            self.workers[chat_id] = asyncio.create_task(self._worker(chat_id, queue))
+        return True
+
+    def _refill(self, chat_id, queue):
+        """Переносит обновления чата из переполнения в освободившиеся места очереди."""
+        overflow = self.overflow.get(chat_id)
+        while overflow and not queue.full():
+            queue.put_nowait(overflow.popleft())
+            self.overflow_size -= 1
+        if overflow is not None and not overflow:
+            del self.overflow[chat_id]
+
+    async def _worker(self, chat_id, queue):
+        """Последовательно обрабатывает очередь одного чата и завершается, когда она пуста."""
+        try:
+            while not queue.empty():
+                update = queue.get_nowait()
+                self._refill(chat_id, queue)
+                try:
+                    async with self.semaphore:
+                        await self.handler(chat_id, update)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"Ошибка обработки обновления для chat_id={chat_id}: {e}")
+                    logging.error(traceback.format_exc())
+                finally:
+                    queue.task_done()
+        finally:
+            # Освобождаем ресурсы неактивного чата, чтобы память не росла с числом чатов
+            self.workers.pop(chat_id, None)
+            self.queues.pop(chat_id, None)
+            overflow = self.overflow.pop(chat_id, None)
+            if overflow:
+                # Обработчик отменен: неразобранное переполнение больше не ждет
+                self.overflow_size -= len(overflow)
+
+    def queue_depths(self):
+        """Возвращает количество ожидающих обновлений по каждому активному чату, включая переполнение."""
+        return {chat_id: queue.qsize() + len(self.overflow.get(chat_id, ())) for chat_id, queue in self.queues.items()}
+
+    @property
+    def active_chats(self):
+        """Количество чатов, у которых сейчас есть обработчик."""
+        return len(self.workers)
+
+    async def shutdown(self):
+        """Отменяет обработчики всех чатов."""
+        workers = list(self.workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.workers.clear()
+        self.queues.clear()
+        self.overflow.clear()
+        self.overflow_size = 0
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import aiohttp
+from config import FLUX_MAX_CONCURRENCY, FLUX_POLL_INTERVAL, FLUX_MAX_POLL_INTERVAL, FLUX_JOB_TIMEOUT
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+QUEUE_BASE = "https://queue.fal.run"
+
+class FluxQueue:
+    """
+    Клиент очереди fal.ai: генерация изображения как задача.
+
+    Запрос на генерацию ставится в очередь и сразу возвращает идентификатор
+    задачи, после чего клиент опрашивает ее статус с растущим интервалом.
+    Медленная генерация не обрывается по таймауту соединения и не запускается
+    заново; задача отменяется на стороне fal.ai, если ее перестали ждать.
+    Число одновременно выполняющихся задач ограничено семафором.
+    """
+    def __init__(self, api_key, model="fal-ai/flux-pro/v1.1-ultra", max_jobs=FLUX_MAX_CONCURRENCY,
+                 poll_interval=FLUX_POLL_INTERVAL, max_poll_interval=FLUX_MAX_POLL_INTERVAL, timeout=FLUX_JOB_TIMEOUT):
+        """
+        Параметры:
+            api_key (str): Ключ fal.ai
+            model (str): Идентификатор модели в очереди fal.ai
+            max_jobs (int): Максимальное число одновременных задач
+            poll_interval (float): Начальный интервал опроса статуса, секунды
+            max_poll_interval (float): Максимальный интервал опроса, секунды
+            timeout (float): Сколько ждать завершения задачи, секунды
+        """
+        self.url = f"{QUEUE_BASE}/{model}"
+        self.headers = {
+            "Authorization": f"Key {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_jobs)
+        self.in_flight = 0  # Сколько задач выполняется сейчас
+
+    async def run(self, session, data):
+        """
+        Ставит генерацию в очередь и ждет результата.
+        Возвращает ответ модели (словарь с ключом images) или None.
+        """
+        async with self.semaphore:
+            job = await self.submit(session, data)
+            if job is None:
+                return None
+            self.in_flight += 1
+            try:
+                return await asyncio.wait_for(self.wait(session, job), self.timeout)
+            except asyncio.TimeoutError:
+                logging.error(f"Задача FLUX {job['request_id']} не завершилась за {self.timeout} с")
+                await self.cancel(session, job)
+                return None
+            except asyncio.CancelledError:
+                # Результат больше не нужен: освобождаем место в очереди fal.ai
+                await asyncio.shield(self.cancel(session, job))
+                raise
+            finally:
+                self.in_flight -= 1
+
+    async def submit(self, session, data):
+        """Ставит задачу в очередь. Возвращает описание задачи или None."""
+        try:
+            async with session.post(self.url, headers=self.headers, json=data, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                if response.status not in (200, 201, 202):
+                    logging.error(f"Ошибка постановки задачи FLUX в очередь: {response.status} - {await response.text()}")
+                    return None
+                job = await response.json()
+        except Exception as e:
+            logging.error(f"Ошибка постановки задачи FLUX в очередь: {e}")
+            return None
+
+        request_id = job.get("request_id")
+        if not request_id:
+            logging.error(f"Очередь FLUX не вернула идентификатор задачи: {job}")
+            return None
+        requests_url = f"{self.url}/requests/{request_id}"
+        job.setdefault("status_url", f"{requests_url}/status")
+        job.setdefault("response_url", requests_url)
+        job.setdefault("cancel_url", f"{requests_url}/cancel")
+        logging.info(f"Задача FLUX поставлена в очередь: {request_id}")
+        return job
+
+    async def wait(self, session, job):
+        """Опрашивает статус задачи до завершения и возвращает ее результат или None."""
+        interval = self.poll_interval
+        while True:
+            await asyncio.sleep(interval)
+            status = await self._status(session, job)
+            if status == "COMPLETED":
+                return await self._result(session, job)
+            if status not in ("IN_QUEUE", "IN_PROGRESS", None):
+                logging.error(f"Задача FLUX {job['request_id']} завершилась со статусом {status}")
+                return None
+            # None — временная ошибка опроса: просто спрашиваем позже
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+    async def cancel(self, session, job):
+        """Отменяет задачу в очереди fal.ai."""
+        try:
+            async with session.put(job["cancel_url"], headers=self.headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                logging.info(f"Задача FLUX {job['request_id']} отменена: {response.status}")
+        except Exception as e:
+            logging.error(f"Ошибка отмены задачи FLUX {job['request_id']}: {e}")
+
+    async def _status(self, session, job):
+        try:
+            async with session.get(job["status_url"], headers=self.headers, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                if 400 <= response.status < 500 and response.status != 429:
+                    # Неверный ключ или неизвестная задача: ожидание не поможет
+                    logging.error(f"Ошибка опроса задачи FLUX {job['request_id']}: {response.status} - {await response.text()}")
+                    return f"HTTP {response.status}"
+                if response.status not in (200, 202):
+                    logging.warning(f"Ошибка опроса задачи FLUX {job['request_id']}: {response.status}")
+                    return None
+                return (await response.json()).get("status")
+        except Exception as e:
+            logging.warning(f"Ошибка опроса задачи FLUX {job['request_id']}: {e}")
+            return None
+
+    async def _result(self, session, job):
+        try:
+            async with session.get(job["response_url"], headers=self.headers, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                if response.status != 200:
+                    logging.error(f"Ошибка получения результата задачи FLUX {job['request_id']}: {response.status} - {await response.text()}")
+                    return None
+                return await response.json()
+        except Exception as e:
+            logging.error(f"Ошибка получения результата задачи FLUX {job['request_id']}: {e}")
+            return None
@@ -1,7 +1,13 @@
 import os
 import logging
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import google.generativeai as genai
 from dotenv import load_dotenv
+from config import GOOGLE_AI_MAX_WORKERS
+from metrics import provider_latency
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,14 +23,23 @@ logging.basicConfig(
 load_dotenv()
 
 class GoogleAI:
+    # Общий ограниченный пул потоков для синхронного SDK Gemini
+    _executor = None
+
     def __init__(self, api_key=None):
         """
         Инициализация клиента Google Generative AI (Gemini)
         
+        Сетевых запросов при создании не выполняется: модель и список
+        доступных моделей получаются при первом обращении.
+        
         Параметры:
             api_key (str): API ключ Google AI. Если не указан, будет использован из переменных окружения.
         """
         self.api_key = api_key or os.getenv("GOOGLE_AI_KEY")
+        self.model = None
+        self.models = None  # Кэш списка доступных моделей
+        self._models_lock = asyncio.Lock()
         
         if not self.api_key:
             logging.warning("API ключ для Google AI не найден. Генерация контента будет недоступна.")
@@ -32,11 +47,22 @@ class GoogleAI:
             
         # Инициализация API
         genai.configure(api_key=self.api_key)
-        
-        # Получение доступных моделей
-        try:
-            self.models = [m for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-            
+    
+    @classmethod
+    def _get_executor(cls):
+        """Возвращает пул потоков для вызовов SDK, создавая его при первом обращении."""
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=GOOGLE_AI_MAX_WORKERS, thread_name_prefix="google_ai")
+        return cls._executor
+    
+    async def _run_in_executor(self, func, *args, **kwargs):
+        """Выполняет синхронный вызов SDK в пуле потоков, не блокируя цикл событий."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(func, *args, **kwargs))
+    
+    def _get_model(self):
+        """Создает модель при первом обращении."""
+        if self.model is None:
             # Используем Gemini 2.0 Flash для более быстрого ответа
             # Если эта модель недоступна, автоматически вернемся к gemini-pro
             try:
@@ -45,11 +71,22 @@ class GoogleAI:
             except Exception as e:
                 logging.warning(f"Модель gemini-2.0-flash недоступна: {e}. Используем gemini-pro")
                 self.model = genai.GenerativeModel('gemini-pro')
-            
-            logging.info(f"Google AI клиент инициализирован. Доступные модели: {[m.name for m in self.models]}")
-        except Exception as e:
-            logging.error(f"Ошибка при инициализации Google AI: {e}")
-            self.models = []
+        return self.model
+    
+    async def get_models(self):
+        """Возвращает список моделей с поддержкой generateContent. Результат кэшируется."""
+        if self.models is not None or not self.api_key:
+            return self.models or []
+        async with self._models_lock:
+            if self.models is None:
+                try:
+                    models = await self._run_in_executor(lambda: list(genai.list_models()))
+                    self.models = [m for m in models if 'generateContent' in m.supported_generation_methods]
+                    logging.info(f"Google AI: доступные модели: {[m.name for m in self.models]}")
+                except Exception as e:
+                    logging.error(f"Ошибка при получении списка моделей Google AI: {e}")
+                    return []
+        return self.models
     
     async def generate_content(self, prompt, max_tokens=4000, temperature=0.7):
         """
@@ -63,10 +100,12 @@ class GoogleAI:
         Возвращает:
             str: Сгенерированный текст
         """
-        if not self.api_key or not hasattr(self, 'model'):
+        if not self.api_key:
             return "API ключ для Google AI не настроен или модель не инициализирована."
             
         try:
+            model = self._get_model()
+            
             # Настройка параметров генерации
             generation_config = {
                 "temperature": temperature,
@@ -75,11 +114,16 @@ class GoogleAI:
                 "top_k": 40,
             }
             
-            # Генерация ответа
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
+            # Генерация ответа в пуле потоков: SDK синхронный
+            started = time.monotonic()
+            try:
+                response = await self._run_in_executor(
+                    model.generate_content,
+                    prompt,
+                    generation_config=generation_config
+                )
+            finally:
+                provider_latency.observe(time.monotonic() - started, "google")
             
             # Извлечение текста из ответа
             result = response.text
@@ -184,8 +228,6 @@ class GoogleAI:
 
 # Пример использования
 if __name__ == "__main__":
-    import asyncio
-    
     async def test_google_ai():
         ai = GoogleAI()
         result = await ai.generate_historical_content(
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from aiohttp import web
+from config import PORT, READY_MAX_LOOP_LAG, READY_TELEGRAM_CHECK_INTERVAL, READY_CHECK_TIMEOUT, LOOP_LAG_INTERVAL
+from database_manager import ping_database, database_stats
+from metrics import provider_latency, render_metric
+from single_flight import SingleFlight
+from telegram_client import get_telegram_client
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class HealthServer:
+    """
+    HTTP-сервер проверок и метрик, работающий в цикле событий бота.
+
+    / и /healthz отвечают 200, пока цикл событий обрабатывает запросы;
+    /readyz отвечает 200, только если доступны база и Telegram, а задержка
+    цикла событий не превышает READY_MAX_LOOP_LAG, иначе 503;
+    /metrics отдает метрики в текстовом формате Prometheus. В режиме webhook
+    на этом же сервере принимаются обновления от Telegram.
+    """
+    def __init__(self, port=PORT, dispatcher=None, open_router_api=None, flux_api=None, state_store=None):
+        self.port = port
+        self.dispatcher = dispatcher
+        self.open_router_api = open_router_api
+        self.flux_api = flux_api
+        self.state_store = state_store
+        self.app = web.Application()
+        self.app.router.add_get("/", self.healthz)
+        self.app.router.add_get("/healthz", self.healthz)
+        self.app.router.add_get("/readyz", self.readyz)
+        self.app.router.add_get("/metrics", self.metrics)
+        self.loop_lag = 0.0
+        self._telegram_ok = None
+        self._telegram_checked = 0.0
+        self._flight = SingleFlight("readyz")  # Одновременные проверки делят один запрос к Telegram
+        self._runner = None
+        self._lag_task = None
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "0.0.0.0", self.port).start()
+        self._lag_task = asyncio.create_task(self._measure_loop_lag())
+        logging.info(f"HTTP-сервер запущен на порту {self.port}")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _measure_loop_lag(self):
+        """Задержка цикла событий — насколько позже срока просыпается короткий сон."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, loop.time() - started - LOOP_LAG_INTERVAL)
+
+    async def healthz(self, request):
+        return web.Response(text="Bot is running")
+
+    async def _check_database(self):
+        try:
+            await asyncio.wait_for(ping_database(), READY_CHECK_TIMEOUT)
+            return True
+        except Exception as e:
+            logging.error(f"Проверка готовности: база данных недоступна: {e!r}")
+            return False
+
+    async def _ping_telegram(self):
+        data = await get_telegram_client().call("getMe", limited=False, attempts=1, timeout=READY_CHECK_TIMEOUT)
+        self._telegram_ok = bool(data and data.get("ok"))
+        self._telegram_checked = time.monotonic()
+        if not self._telegram_ok:
+            logging.error(f"Проверка готовности: Telegram недоступен: {data}")
+        return self._telegram_ok
+
+    async def _check_telegram(self):
+        # Результат запоминается, чтобы частые проверки не тратили запросы к Telegram
+        if self._telegram_ok is not None and time.monotonic() - self._telegram_checked < READY_TELEGRAM_CHECK_INTERVAL:
+            return self._telegram_ok
+        return await self._flight.do("telegram", self._ping_telegram)
+
+    async def readyz(self, request):
+        database, telegram = await asyncio.gather(self._check_database(), self._check_telegram())
+        loop_ok = self.loop_lag <= READY_MAX_LOOP_LAG
+        checks = {"database": database, "telegram": telegram, "event_loop": loop_ok}
+        status = 200 if all(checks.values()) else 503
+        return web.json_response({**checks, "loop_lag": round(self.loop_lag, 4)}, status=status)
+
+    def collect(self):
+        """Собирает строки метрик в формате Prometheus."""
+        lines = render_metric("bot_event_loop_lag_seconds", "gauge", "Задержка цикла событий", [({}, self.loop_lag)])
+
+        db_stats = database_stats()
+        queues = [({"queue": "usage_stats"}, db_stats["usage_stats_pending"])]
+        if self.dispatcher is not None:
+            queues.append(({"queue": "updates"}, sum(self.dispatcher.queue_depths().values())))
+            lines += render_metric("bot_active_chats", "gauge", "Чаты, обновления которых обрабатываются", [({}, self.dispatcher.active_chats)])
+        if self.state_store is not None:
+            queues.append(({"queue": "chat_state"}, self.state_store.pending_writes))
+        lines += render_metric("bot_queue_depth", "gauge", "Ожидающие обработки или записи элементы", queues)
+
+        in_flight, shared = [], []
+        caches = [("settings", db_stats["settings_cache_hits"], db_stats["settings_cache_misses"])]
+        if self.open_router_api is not None:
+            in_flight.append(({"operation": "text"}, self.open_router_api.flight.in_flight))
+            shared.append(({"operation": "text"}, self.open_router_api.flight.shared))
+            if self.open_router_api.cache is not None:
+                caches.append(("llm", self.open_router_api.cache.hits, self.open_router_api.cache.misses))
+        if self.flux_api is not None:
+            in_flight.append(({"operation": "image"}, self.flux_api.flight.in_flight))
+            shared.append(({"operation": "image"}, self.flux_api.flight.shared))
+            if self.flux_api.queue is not None:
+                in_flight.append(({"operation": "flux_job"}, self.flux_api.queue.in_flight))
+            if self.flux_api.cache is not None:
+                caches.append(("image", self.flux_api.cache.hits, self.flux_api.cache.misses))
+        lines += render_metric("bot_generations_in_flight", "gauge", "Выполняющиеся генерации", in_flight)
+        lines += render_metric("bot_generations_shared_total", "counter", "Вызовы, получившие результат уже выполнявшейся генерации", shared)
+
+        lines += render_metric("bot_cache_hits_total", "counter", "Попадания в кэш", [({"cache": name}, hits) for name, hits, _ in caches])
+        lines += render_metric("bot_cache_misses_total", "counter", "Промахи кэша", [({"cache": name}, misses) for name, _, misses in caches])
+        lines += render_metric("bot_cache_hit_ratio", "gauge", "Доля попаданий в кэш", [
+            ({"cache": name}, hits / (hits + misses) if hits + misses else 0.0) for name, hits, misses in caches
+        ])
+
+        lines += provider_latency.render()
+        return lines
+
+    async def metrics(self, request):
+        body = "\n".join(self.collect()) + "\n"
+        return web.Response(body=body.encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from config import HEDGE_WINDOW_SIZE, HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class LatencyTracker:
+    """Скользящее окно задержек по каждому провайдеру для расчета порога хеджирования."""
+    def __init__(self, window_size=HEDGE_WINDOW_SIZE):
+        self.window_size = window_size
+        self._samples = {}  # провайдер -> deque задержек, секунды
+
+    def record(self, name, latency):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.window_size)
+        samples.append(latency)
+
+    def percentile(self, name, q=HEDGE_PERCENTILE):
+        """Возвращает перцентиль задержки провайдера или None, если замеров мало."""
+        samples = self._samples.get(name)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def hedge_delay(self, name):
+        """Через сколько секунд без ответа провайдера запускать следующего."""
+        value = self.percentile(name)
+        if value is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(value, HEDGE_MIN_DELAY)
+
+async def hedged_call(calls, tracker, is_valid, hedge=True):
+    """
+    Выполняет запрос к нескольким провайдерам с хеджированием.
+
+    Первый провайдер запускается сразу. Если он не ответил за время,
+    равное перцентилю его задержки, параллельно запускается следующий;
+    если ответ пришел, но не прошел проверку, следующий запускается
+    немедленно. Побеждает первый корректный ответ, остальные запросы
+    отменяются. Без хеджирования провайдеры перебираются по очереди.
+
+    Параметры:
+        calls (list): Пары (имя провайдера, функция без аргументов, возвращающая корутину)
+        tracker (LatencyTracker): Статистика задержек провайдеров
+        is_valid (callable): Проверка результата
+        hedge (bool): Запускать ли следующего провайдера по таймауту
+
+    Возвращает:
+        Первый корректный результат или None.
+    """
+    pending = {}  # задача -> (провайдер, время запуска)
+    next_index = 0
+
+    def launch():
+        nonlocal next_index
+        name, func = calls[next_index]
+        next_index += 1
+        pending[asyncio.ensure_future(func())] = (name, time.monotonic())
+        return name
+
+    try:
+        current = launch()
+        while pending:
+            timeout = None
+            if hedge and next_index < len(calls):
+                started = max(started for _, started in pending.values())
+                timeout = max(tracker.hedge_delay(current) - (time.monotonic() - started), 0)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                logging.info(f"Провайдер {current} не ответил за {tracker.hedge_delay(current):.1f} с, запускаем {calls[next_index][0]}")
+                current = launch()
+                continue
+
+            for task in done:
+                name, started = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logging.error(f"Ошибка провайдера {name}: {e}")
+                    result = None
+                if is_valid(result):
+                    tracker.record(name, time.monotonic() - started)
+                    return result
+                logging.warning(f"Провайдер {name} вернул некорректный ответ")
+
+            if next_index < len(calls) and (hedge or not pending):
+                current = launch()
+        return None
+    finally:
+        now = time.monotonic()
+        for task, (name, started) in pending.items():
+            task.cancel()
+            # Время отмененного запроса — нижняя граница его задержки; без него
+            # медленный провайдер, которого всегда обгоняют, выглядел бы быстрым
+            tracker.record(name, now - started)
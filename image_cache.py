@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import weakref
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES
+from database_manager import get_cached_image, save_cached_image, set_cached_image_file_id, delete_cached_image, evict_cached_images
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class CachedImage:
+    """
+    Изображение в файле на диске.
+
+    Байты изображения не держатся в памяти: каждая отправка открывает файл
+    заново через open(), и aiohttp читает его частями прямо в запрос.
+    key — ключ в кэше изображений, file_id — идентификатор файла в Telegram,
+    если изображение уже отправлялось: тогда его можно отправить повторно
+    по file_id, не загружая байты заново. url — ссылка, по которой изображение
+    доступно в интернете, если она известна. Временный файл (temporary=True)
+    удаляется, когда объект больше не используется.
+    """
+    def __init__(self, path, key=None, file_id=None, temporary=False, url=None):
+        self.path = path
+        self.key = key
+        self.file_id = file_id
+        self.url = url
+        self.local = False  # Локальная заглушка вместо настоящей генерации
+        if temporary:
+            weakref.finalize(self, _remove_file, path)
+
+    def open(self):
+        """Открывает файл изображения для чтения."""
+        return open(self.path, "rb")
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class ImageCache:
+    """
+    Кэш сгенерированных изображений на диске.
+
+    Ключ — хэш нормализованного промпта и параметров генерации. Файлы
+    лежат в каталоге directory, размер и file_id Telegram — в таблице
+    image_cache. Общий размер файлов ограничен max_bytes, сверх него
+    удаляются давно неиспользуемые изображения.
+    """
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prompt, **params):
+        """Строит ключ кэша: регистр и лишние пробелы в промпте не влияют на ключ."""
+        normalized = " ".join(prompt.split()).casefold()
+        raw = json.dumps({"prompt": normalized, **params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    async def get(self, key):
+        """Возвращает CachedImage из кэша или None."""
+        try:
+            entry = await get_cached_image(key)
+            if entry is not None:
+                _, file_id = entry
+                if os.path.exists(self.path(key)):
+                    self.hits += 1
+                    return CachedImage(self.path(key), key=key, file_id=file_id)
+                # Файл удалили вручную или диск очистился при перезапуске
+                await delete_cached_image(key)
+        except Exception as e:
+            logging.error(f"Ошибка чтения кэша изображений: {e}")
+        self.misses += 1
+        return None
+
+    async def adopt(self, key, image):
+        """
+        Переносит файл изображения в кэш и вытесняет старые сверх лимита размера.
+        Файл переименовывается, а не копируется. Возвращает изображение из кэша
+        или исходное, если сохранить не удалось.
+        """
+        try:
+            size = image.size
+            await asyncio.to_thread(os.replace, image.path, self.path(key))
+        except Exception as e:
+            logging.error(f"Ошибка записи в кэш изображений: {e}")
+            return image
+        cached = CachedImage(self.path(key), key=key, url=image.url)
+        try:
+            await save_cached_image(key, size)
+            for evicted in await evict_cached_images(self.max_bytes):
+                if evicted == key:
+                    # Изображение больше всего кэша: отдаем его как временный файл
+                    cached = CachedImage(self.path(key), temporary=True, url=image.url)
+                else:
+                    await asyncio.to_thread(_remove_file, self.path(evicted))
+        except Exception as e:
+            logging.error(f"Ошибка записи в кэш изображений: {e}")
+        return cached
+
+    async def set_file_id(self, key, file_id):
+        """Запоминает file_id Telegram для изображения из кэша."""
+        try:
+            await set_cached_image_file_id(key, file_id)
+        except Exception as e:
+            logging.error(f"Ошибка сохранения file_id в кэше изображений: {e}")
@@ -3,14 +3,19 @@ import aiohttp
 import asyncio
 import logging
 import base64
-import io
 import time
+import tempfile
 import json
 import socket
 import os
 from random import randint
 from PIL import Image, ImageDraw, ImageFont
 from dotenv import load_dotenv
+from config import FLUX_MAX_CONCURRENCY, IMAGE_CACHE_ENABLED, FLUX_USE_QUEUE
+from single_flight import SingleFlight
+from image_cache import ImageCache, CachedImage
+from flux_queue import FluxQueue
+from metrics import provider_latency
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -61,12 +66,11 @@ async def create_local_test_image(prompt, session=None):
         
         logging.info(f"Локальное тестовое изображение сохранено в файл: {filename}")
         
-        # Возвращаем байтовый поток с изображением
-        bytesio = io.BytesIO()
-        img.save(bytesio, format='JPEG')
-        bytesio.seek(0)
+        # Возвращаем изображение из сохраненного файла
+        image = CachedImage(filename)
+        image.local = True  # Не настоящая генерация: такое изображение не кэшируется
         
-        return bytesio
+        return image
     except Exception as e:
         logging.error(f"Ошибка создания локального тестового изображения: {e}")
         import traceback
@@ -90,9 +94,62 @@ class FLUX_API:
         }
         # Флаг, указывающий, что API недоступно
         self.api_unavailable = False
+        # Ограничение числа одновременных запросов к FLUX API; в режиме очереди тот же
+        # FLUX_MAX_CONCURRENCY ограничивает число задач FluxQueue
+        self.semaphore = asyncio.Semaphore(FLUX_MAX_CONCURRENCY)
+        # Одинаковые одновременные запросы выполняются одним обращением к API
+        self.flight = SingleFlight("FLUX")
+        # Генерация через очередь fal.ai: задача ставится в очередь и опрашивается до завершения
+        self.queue = FluxQueue(self.API_KEY) if FLUX_USE_QUEUE else None
+        # Готовые изображения и их file_id в Telegram хранятся на диске
+        self.cache = ImageCache() if IMAGE_CACHE_ENABLED else None
+        # Загружаемые изображения пишутся сразу в файл; в каталоге кэша, чтобы переносить их туда переименованием
+        self.spool_dir = self.cache.directory if self.cache else tempfile.gettempdir()
+
+    def _request_params(self):
+        """Параметры генерации, кроме промпта."""
+        return {
+            "num_images": 1,
+            "enable_safety_checker": True, 
+            "safety_tolerance": "2",
+            "output_format": "jpeg",
+            "aspect_ratio": "1:1"
+        }
 
     async def generate_image(self, prompt, session=None):
-        """Генерирует изображение через fal.ai FLUX API."""
+        """
+        Генерирует изображение через fal.ai FLUX API.
+        
+        Возвращает CachedImage — изображение в файле на диске. Изображение
+        для уже встречавшегося промпта берется из кэша без обращения к API,
+        а если оно уже отправлялось в Telegram, у него заполнен file_id.
+        Одновременные запросы с одинаковым промптом разделяют одну генерацию
+        и один файл.
+        """
+        key = ImageCache.make_key(prompt, url=self.URL, **self._request_params())
+        return await self.flight.do(key, lambda: self._cached_or_generate(prompt, key, session))
+
+    async def remember_file_id(self, image, file_id):
+        """Сохраняет file_id, полученный Telegram при отправке изображения из generate_image."""
+        key = getattr(image, "key", None)
+        if self.cache is None or not key or not file_id or file_id == getattr(image, "file_id", None):
+            return
+        await self.cache.set_file_id(key, file_id)
+
+    async def _cached_or_generate(self, prompt, key, session=None):
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                logging.info(f"Изображение FLUX взято из кэша, file_id={'есть' if cached.file_id else 'нет'}")
+                return cached
+        image = await self._generate_image(prompt, session)
+        # Локальные тестовые изображения не кэшируются: при следующем запросе API может заработать
+        if image is not None and self.cache is not None and not image.local:
+            image = await self.cache.adopt(key, image)
+        return image
+
+    async def _generate_image(self, prompt, session=None):
+        """Выполняет генерацию изображения с повторными попытками."""
         # Если мы уже знаем, что API недоступно, сразу создаем локальное изображение
         if self.api_unavailable:
             logging.warning("Предыдущие попытки показали, что API недоступно. Создаем локальное изображение.")
@@ -104,14 +161,7 @@ class FLUX_API:
             return await create_local_test_image(prompt, session)
             
         logging.info(f"Генерация изображения FLUX, длина промпта={len(prompt)}")
-        data = {
-            "prompt": prompt,
-            "num_images": 1,
-            "enable_safety_checker": True, 
-            "safety_tolerance": "2",
-            "output_format": "jpeg",
-            "aspect_ratio": "1:1"
-        }
+        data = {"prompt": prompt, **self._request_params()}
         
         # Создаем сессию, если нужно
         close_session = False
@@ -124,6 +174,14 @@ class FLUX_API:
                 try:
                     logging.info(f"Отправка запроса на генерацию FLUX изображения (попытка {attempt + 1})")
                     
+                    if self.queue is not None:
+                        # Медленная генерация дожидается в очереди, а не запускается заново
+                        result = await self._queue_request(session, data, attempt)
+                        if result:
+                            return result
+                        await asyncio.sleep(2 * (attempt + 1))
+                        continue
+                    
                     # Основной URL
                     result = await self._try_request(session, self.URL, data, attempt)
                     if result:
@@ -155,6 +213,15 @@ class FLUX_API:
                 await session.close()
         
     async def _try_request(self, session, url, data, attempt):
+        """Выполняет запрос к API с учетом ограничения параллельности."""
+        async with self.semaphore:
+            started = time.monotonic()
+            try:
+                return await self._request_image(session, url, data, attempt)
+            finally:
+                provider_latency.observe(time.monotonic() - started, "flux")
+
+    async def _request_image(self, session, url, data, attempt):
         """Выполняет запрос к API и обрабатывает результат."""
         try:
             async with session.post(url, headers=self.headers, json=data, timeout=aiohttp.ClientTimeout(total=30)) as response:
@@ -171,28 +238,54 @@ class FLUX_API:
                     logging.error(f"Необычный формат ответа FLUX API: {result}")
                     return None
                 
-                image_url = result["images"][0].get("url", "")
-                
-                if not image_url:
-                    logging.error(f"FLUX API не вернул URL изображения (попытка {attempt + 1})")
+                return await self._download_image(session, result, attempt)
+                        
+        except Exception as e:
+            logging.error(f"Ошибка при запросе к {url}: {e}")
+            return None
+
+    async def _queue_request(self, session, data, attempt):
+        """Выполняет генерацию через очередь fal.ai и загружает результат."""
+        started = time.monotonic()
+        result = await self.queue.run(session, data)
+        provider_latency.observe(time.monotonic() - started, "flux")
+        if not result or "images" not in result:
+            logging.error(f"Очередь FLUX не вернула изображение (попытка {attempt + 1}): {result}")
+            return None
+        return await self._download_image(session, result, attempt)
+
+    async def _download_image(self, session, result, attempt):
+        """Загружает изображение по ссылке из ответа FLUX API."""
+        try:
+            image_url = result["images"][0].get("url", "")
+            
+            if not image_url:
+                logging.error(f"FLUX API не вернул URL изображения (попытка {attempt + 1})")
+                return None
+            
+            logging.info(f"Получен URL изображения: {image_url}")
+            
+            # Загружаем изображение по ссылке
+            async with session.get(image_url, timeout=aiohttp.ClientTimeout(total=30)) as img_response:
+                if img_response.status != 200:
+                    logging.error(f"Ошибка загрузки изображения: {img_response.status}")
                     return None
                 
-                logging.info(f"Получен URL изображения: {image_url}")
+                # Пишем изображение в файл частями, не собирая его целиком в памяти
+                fd, path = tempfile.mkstemp(suffix=".jpg", dir=self.spool_dir)
+                # Ссылка fal.ai остается запасным способом доставки: Telegram может скачать изображение сам
+                image = CachedImage(path, temporary=True, url=image_url)
+                size = 0
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in img_response.content.iter_chunked(64 * 1024):
+                        f.write(chunk)
+                        size += len(chunk)
+                logging.info(f"Изображение FLUX загружено, размер={size} байт")
                 
-                # Загружаем изображение по ссылке
-                async with session.get(image_url, timeout=aiohttp.ClientTimeout(total=30)) as img_response:
-                    if img_response.status != 200:
-                        logging.error(f"Ошибка загрузки изображения: {img_response.status}")
-                        return None
-                    
-                    image_data = await img_response.read()
-                    logging.info(f"Изображение FLUX загружено, размер={len(image_data)} байт")
-                    
-                    if image_data:
-                        return io.BytesIO(image_data)
-                        
+                if size:
+                    return image
         except Exception as e:
-            logging.error(f"Ошибка при запросе к {url}: {e}")
+            logging.error(f"Ошибка загрузки изображения FLUX: {e}")
             return None
         
-        return None
\ No newline at end of file
+        return None
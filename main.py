@@ -6,8 +6,7 @@ import logging
 import asyncio
 import random
 import time
-import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import secrets
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 import traceback
@@ -15,14 +14,22 @@ from telegram import Update, Bot
 from telegram.ext import Application, CommandHandler, ContextTypes
 import aiohttp
 from langdetect import detect
-from config import TELEGRAM_BOT_TOKEN, TEST_CHANNEL_ID, MAX_POST_LENGTH
-from telegram_bot import send_telegram_post, send_telegram_message, edit_telegram_message, forward_telegram_post
-from content_generator import OpenRouterAPI  # Используем OpenRouter вместо YandexGPTAPI
+from config import (
+    TELEGRAM_BOT_TOKEN, TEST_CHANNEL_ID, MAX_POST_LENGTH, OVERLAP_IMAGE_GENERATION, STREAM_POST_PROGRESS, BATCH_GENERATION,
+    UPDATE_MODE, WEBHOOK_URL, WEBHOOK_SECRET, SCHEDULE_CHECK_INTERVAL
+)
+from telegram_bot import send_telegram_post, send_telegram_message, edit_telegram_message, forward_telegram_post, republish_post
+from telegram_client import get_telegram_client, close_telegram_clients
+from progress import ProgressReporter
+from health import HealthServer
+from webhook import add_webhook_routes, set_webhook, delete_webhook, update_chat_id, ALLOWED_UPDATES
+from content_generator import OpenRouterAPI, ContentGenerator  # Используем OpenRouter вместо YandexGPTAPI
 from image_processor import FLUX_API   # Используем FLUX_API для изображений
-from database_manager import setup_database, save_client_settings, get_client_settings, save_post_result, get_pending_posts, delete_schedule_entry, get_post_count_this_month, save_schedule, clean_old_posts, save_usage_stat
+from database_manager import setup_database, save_client_settings, get_client_settings, save_post_result, get_pending_posts, delete_schedule_entry, get_post_count_this_month, save_schedule, clean_old_posts, save_usage_stat, get_recent_post_ids, close_database
 from menus import translations, language_menu, get_main_menu, get_more_menu, get_style_menu, get_subscription_menu
 from instructions import instructions
-import aiosqlite
+from dispatcher import UpdateDispatcher
+from state_store import ChatStateStore
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
@@ -39,15 +46,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Глобальные словари для отслеживания состояния пользователей
-current_language = {}  # Текущий язык пользователя
-awaiting_theme = {}    # Ожидаем ли ввода темы
-awaiting_channel = {}  # Ожидаем ли ввода канала
-awaiting_payment = {}  # Ожидаем ли оплаты
-current_style = {}     # Текущий стиль постов
-awaiting_generate = {} # Ожидаем ли команду /generate или ввода темы после неё
-awaiting_feedback = {} # Ожидаем ли обратной связи
-generate_image_flag = {} # Флаг генерации изображений (True/False)
+# Состояние пользователей хранится в базе и переживает перезапуски;
+# поля ниже работают как словари chat_id -> значение
+state_store = ChatStateStore()
+current_language = state_store.field("language")        # Текущий язык пользователя
+awaiting_theme = state_store.field("awaiting_theme")     # Ожидаем ли ввода темы
+awaiting_channel = state_store.field("awaiting_channel") # Ожидаем ли ввода канала
+awaiting_payment = state_store.field("awaiting_payment") # Ожидаем ли оплаты
+current_style = state_store.field("style")               # Текущий стиль постов
+awaiting_generate = state_store.field("awaiting_generate") # Ожидаем ли команду /generate или ввода темы после неё
+awaiting_feedback = state_store.field("awaiting_feedback") # Ожидаем ли обратной связи
+generate_image_flag = state_store.field("generate_image")  # Флаг генерации изображений (True/False)
+published_batch = state_store.field("published_batch")     # Тема, количество, стиль и язык последнего опубликованного пакета
 
 class HistoricalBot:
     def __init__(self):
@@ -138,7 +148,7 @@ class HistoricalBot:
                 full_text = f"<b>{title}</b>\n\n{content}"
                 
                 # Отправляем пост в Telegram
-                result = await self.telegram_bot.send_telegram_post(full_text, image, session)
+                result = await self.telegram_bot.send_telegram_post(full_text, image)
                 if result:
                     logger.info("Пост успешно отправлен в Telegram")
                     return True
@@ -216,23 +226,6 @@ class HistoricalBot:
         else:
             await update.message.reply_text("Неизвестная команда. Используйте /start для получения списка команд.")
 
-class SimpleHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b'Bot is running')
-        
-    def log_message(self, format, *args):
-        # Отключаем логирование HTTP-запросов
-        return
-
-def start_webserver():
-    port = int(os.environ.get("PORT", 10000))
-    server = HTTPServer(('0.0.0.0', port), SimpleHandler)
-    logger.info(f"Запуск веб-сервера на порту {port}")
-    server.serve_forever()
-
 async def check_subscription(chat_id):
     """Проверяет статус подписки пользователя."""
     настройки = await get_client_settings(chat_id)
@@ -244,466 +237,558 @@ async def check_subscription(chat_id):
         return "истекла", количество_постов  # Подписка истекла
     return настройки.get("subscription_plan", "бесплатно"), количество_постов  # Активная подписка
 
-async def check_admin_rights(bot_token, channel_id, session):
+async def check_admin_rights(bot_token, channel_id):
     """Проверяет, является ли бот администратором в канале."""
-    url = f"https://api.telegram.org/bot{bot_token}/getChatMember"
-    bot_info_url = f"https://api.telegram.org/bot{bot_token}/getMe"
-    async with session.get(bot_info_url) as bot_response:
-        данные_бота = await bot_response.json()
-        id_бота = данные_бота["result"]["id"]
-    payload = {"chat_id": channel_id, "user_id": id_бота}
-    async with session.post(url, json=payload) as response:
-        данные = await response.json()
-        return данные.get("ok") and данные["result"]["status"] in ["administrator", "creator"]
-
-async def check_channel_exists(channel_id, session):
+    client = get_telegram_client(bot_token)
+    данные_бота = await client.call("getMe", limited=False)
+    if not данные_бота or not данные_бота.get("ok"):
+        return False
+    id_бота = данные_бота["result"]["id"]
+    данные = await client.call("getChatMember", {"chat_id": channel_id, "user_id": id_бота}, limited=False)
+    return bool(данные and данные.get("ok")) and данные["result"]["status"] in ["administrator", "creator"]
+
+async def check_channel_exists(channel_id):
     """Проверяет, существует ли канал с указанным ID."""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getChat"
-    payload = {"chat_id": channel_id}
-    async with session.post(url, json=payload) as response:
-        данные = await response.json()
-        return данные.get("ok")
-
-async def check_schedule(bot_token, session):
-    """Проверяет расписание и отправляет запланированные посты."""
+    данные = await get_telegram_client().call("getChat", {"chat_id": channel_id}, limited=False)
+    return bool(данные and данные.get("ok"))
+
+async def check_schedule(bot_token):
+    """
+    Проверяет расписание и отправляет запланированные посты.
+
+    Посты публикуются заново по сохраненному тексту и file_id изображения,
+    поэтому изображение не загружается повторно, даже если пост запланирован
+    в несколько каналов.
+    """
     try:
         ожидающие_посты = await get_pending_posts()
+        # Один пост может быть запланирован сразу в несколько каналов
+        по_постам = {}
         for пост in ожидающие_посты:
-            chat_id, post_id, channel_id, дата_публикации, message_id = пост
-            if await forward_telegram_post(from_chat_id=TEST_CHANNEL_ID, message_id=message_id, to_chat_id=channel_id, session=session):
-                await delete_schedule_entry(chat_id, post_id)
-                await save_usage_stat(chat_id, "пост_опубликован")
-                await asyncio.sleep(0.1)  # Небольшая задержка
+            по_постам.setdefault(пост[1], []).append(пост)
+        for post_id, записи in по_постам.items():
+            chat_id, _, _, _, message_id, заголовок, контент, хэштеги, file_id = записи[0]
+            каналы = [запись[2] for запись in записи]
+            if контент and хэштеги:
+                message_ids, _ = await republish_post(каналы, f"{заголовок}\n\n{контент}\n\n{хэштеги}", file_id=file_id, token=bot_token)
+            else:
+                # Без сохраненного текста остается только переслать исходное сообщение
+                message_ids = [await forward_telegram_post(from_chat_id=TEST_CHANNEL_ID, message_id=message_id, to_chat_id=канал, token=bot_token) for канал in каналы]
+            for канал, опубликовано in zip(каналы, message_ids):
+                # Неудачные публикации остаются в расписании и повторятся при следующей проверке
+                if опубликовано:
+                    await delete_schedule_entry(chat_id, post_id, канал)
+                    await save_usage_stat(chat_id, "пост_опубликован")
     except Exception as e:
         logging.error(f"Ошибка проверки расписания: {e}")
         await asyncio.sleep(5)  # Задержка при ошибке
 
-async def generate_post(open_router_api, flux_api, заголовок, тема, стиль, chat_id, план_подписки, язык, генерация_изображения, session=None):
-    """Генерирует пост (текст и, при необходимости, изображение)."""
+async def prepare_image(open_router_api, flux_api, заголовок, тема, язык, session=None, промпт_изображения=None, use_cache=True):
+    """Генерирует промпт (если он не передан) и изображение для поста. Возвращает (промпт, данные_изображения)."""
+    if not промпт_изображения:
+        промпт_изображения = await open_router_api.generate_image_prompt(заголовок, тема, language=язык, session=session, use_cache=use_cache)
+    if not промпт_изображения:
+        return None, None
+    данные_изображения = await flux_api.generate_image(промпт_изображения, session=session)
+    return промпт_изображения, данные_изображения
+
+async def prepare_post(open_router_api, flux_api, заголовок, тема, стиль, язык, генерация_изображения, session=None, on_progress=None, готовый=None, use_cache=True):
+    """
+    Готовит пост к публикации: текст, хэштеги и, при необходимости, изображение.
+
+    on_progress — корутина, получающая текст поста по мере генерации.
+    готовый — запись пакетной генерации; отдельные запросы делаются только
+    для тех частей поста, которых в ней нет. use_cache=False запрашивает
+    ответы моделей в обход кэша.
+    """
+    задача_изображения = None
+    готовый = готовый or {}
     try:
         logging.info(f"Генерация поста на языке: {язык}")
-        контент, хэштеги = await open_router_api.generate_post_content(заголовок, тема, стиль, MAX_POST_LENGTH, language=язык, session=session)
+        # Промпт изображения зависит только от заголовка и темы, поэтому
+        # изображение можно готовить одновременно с текстом поста
+        if генерация_изображения and OVERLAP_IMAGE_GENERATION:
+            задача_изображения = asyncio.create_task(prepare_image(open_router_api, flux_api, заголовок, тема, язык, session=session, промпт_изображения=готовый.get("image_prompt"), use_cache=use_cache))
+
+        контент, хэштеги = готовый.get("content"), готовый.get("hashtags")
+        if not контент or not хэштеги:
+            текст_поста = await open_router_api.generate_post_content(заголовок, тема, стиль, MAX_POST_LENGTH, language=язык, session=session, on_progress=on_progress, use_cache=use_cache)
+            # generate_post_content возвращает "контент\n\nхэштеги"
+            контент, _, хэштеги = (текст_поста or "").rpartition("\n\n")
         if not контент or not хэштеги:
             logging.error(f"Не удалось сгенерировать контент или хэштеги для '{заголовок}'")
-            return None, None, None, None, None
-
-        if генерация_изображения:  # Если нужно изображение
-            промпт_изображения = await open_router_api.generate_image_prompt(заголовок, тема, language=язык, session=session)
-            if промпт_изображения:
-                данные_изображения = await flux_api.generate_image(промпт_изображения, session=session)
-            else:
-                данные_изображения = None
-                промпт_изображения = None
-            message_id, file_id = await send_telegram_post(TEST_CHANNEL_ID, f"{заголовок}\n\n{контент}\n\n{хэштеги}", image_data=данные_изображения, session=session)
-        else:  # Без изображения
-            промпт_изображения = None
-            message_id, file_id = await send_telegram_post(TEST_CHANNEL_ID, f"{заголовок}\n\n{контент}\n\n{хэштеги}", session=session)
-
+            return None, None, None, None
+
+        промпт_изображения = None
+        данные_изображения = None
+        if задача_изображения:
+            промпт_изображения, данные_изображения = await задача_изображения
+        elif генерация_изображения:  # Если нужно изображение
+            промпт_изображения, данные_изображения = await prepare_image(open_router_api, flux_api, заголовок, тема, язык, session=session, промпт_изображения=готовый.get("image_prompt"), use_cache=use_cache)
+        return контент, хэштеги, промпт_изображения, данные_изображения
+    except Exception as e:
+        logging.error(f"Ошибка генерации поста '{заголовок}': {e}")
+        return None, None, None, None
+    finally:
+        # Если текст не удался, изображение уже не нужно
+        if задача_изображения and not задача_изображения.done():
+            задача_изображения.cancel()
+
+async def publish_post(flux_api, chat_id, заголовок, контент, хэштеги, промпт_изображения, данные_изображения):
+    """Публикует подготовленный пост и сохраняет результат. Возвращает (file_id, message_id)."""
+    try:
+        message_id, file_id = await send_telegram_post(TEST_CHANNEL_ID, f"{заголовок}\n\n{контент}\n\n{хэштеги}", image_data=данные_изображения)
         if message_id:
+            # Повторная отправка того же изображения обойдется без генерации и загрузки
+            await flux_api.remember_file_id(данные_изображения, file_id)
             await save_post_result(chat_id, заголовок, контент, хэштеги, file_id, промпт_изображения, message_id)
             await save_usage_stat(chat_id, "пост_сгенерирован")
-            await asyncio.sleep(0.1)
-        return контент, хэштеги, file_id, промпт_изображения, message_id
+        return file_id, message_id
     except Exception as e:
-        logging.error(f"Ошибка генерации поста '{заголовок}': {e}")
+        logging.error(f"Ошибка публикации поста '{заголовок}': {e}")
+        return None, None
+
+async def generate_post(open_router_api, flux_api, заголовок, тема, стиль, chat_id, план_подписки, язык, генерация_изображения, session=None):
+    """Генерирует пост (текст и, при необходимости, изображение)."""
+    контент, хэштеги, промпт_изображения, данные_изображения = await prepare_post(open_router_api, flux_api, заголовок, тема, стиль, язык, генерация_изображения, session=session)
+    if контент is None or хэштеги is None:
         return None, None, None, None, None
+    file_id, message_id = await publish_post(flux_api, chat_id, заголовок, контент, хэштеги, промпт_изображения, данные_изображения)
+    return контент, хэштеги, file_id, промпт_изображения, message_id
+
+async def plan_batch(open_router_api, content_generator, тема, количество_постов, стиль, язык_поста, session, use_cache=True):
+    """
+    Получает заголовки пакета постов. Возвращает (список_заголовков, готовые_посты).
+
+    В режиме BATCH_GENERATION один запрос сразу возвращает и тексты, хэштеги
+    и промпты изображений (готовые_посты: номер поста, начиная с 1 -> запись).
+    Если он не удался, заголовки генерируются отдельно, а посты — по одному;
+    если пакет вернул меньше постов, недостающие дополняются так же.
+    use_cache=False запрашивает ответы моделей в обход кэша.
+    """
+    заголовки, готовые_посты = [], {}
+    if BATCH_GENERATION:
+        записи = await open_router_api.generate_batch_posts(тема, количество_постов, стиль, MAX_POST_LENGTH, language=язык_поста, session=session, use_cache=use_cache) or []
+        заголовки = [запись["title"] for запись in записи]
+        готовые_посты = {i: запись for i, запись in enumerate(записи, 1)}
+        if len(заголовки) < количество_постов:
+            logging.warning(f"Пакетная генерация вернула {len(заголовки)} из {количество_постов} постов, остальные генерируем по одному")
+    if len(заголовки) < количество_постов:
+        дополнительные = await content_generator.generate_titles(тема, количество_постов - len(заголовки), language=язык_поста, session=session, use_cache=use_cache)
+        if дополнительные:
+            заголовки += [заголовок for заголовок in дополнительные.split("\n") if заголовок.strip()][:количество_постов - len(заголовки)]
+    if not заголовки:
+        return None, {}
+    return заголовки, готовые_посты
+
+async def generate_batch(open_router_api, flux_api, список_заголовков, количество_постов, тема, стиль, chat_id, язык, язык_поста, генерация_изображения, message_id, главное_меню, session, готовые_посты=None, use_cache=True):
+    """
+    Генерирует пакет постов параллельно и публикует их в порядке заголовков.
+
+    Подготовка всех постов запускается сразу (число одновременных запросов
+    ограничивают сами провайдеры), а публикация идет последовательно, чтобы
+    посты появлялись в канале по порядку. Сообщение о прогрессе обновляется
+    в фоне через ProgressReporter и не задерживает генерацию.
+    готовые_посты — результат пакетной генерации из plan_batch.
+    Возвращает количество опубликованных постов.
+    """
+    готовые_посты = готовые_посты or {}
+    количество_постов = len(список_заголовков)  # Прогресс считается по постам, которые действительно готовятся
+    прогресс_сообщения = ProgressReporter(chat_id, message_id, главное_меню)
+    текущий_пост = 1  # Номер поста, текст которого показывается в сообщении о прогрессе
+    опубликовано = 0
+
+    def показ_текста(i, заголовок):
+        """Возвращает обработчик промежуточного текста поста i или None, если показ выключен."""
+        if not STREAM_POST_PROGRESS:
+            return None
+        async def показать(частичный_текст):
+            # Посты готовятся параллельно, но показываем только тот, публикации которого ждем
+            if i != текущий_пост:
+                return
+            прогресс = (i / количество_постов) * 100
+            заголовок_прогресса = translations[язык]["generating"].format(i=i, post_count=количество_постов, progress=прогресс)
+            прогресс_сообщения.update(f"{заголовок_прогресса}\n\n{заголовок}\n\n{частичный_текст}…")
+        return показать
+
+    задачи = [
+        asyncio.create_task(prepare_post(open_router_api, flux_api, заголовок, тема, стиль, язык_поста, генерация_изображения, session=session, on_progress=показ_текста(i, заголовок), готовый=готовые_посты.get(i), use_cache=use_cache))
+        for i, заголовок in enumerate(список_заголовков, 1)
+    ]
+    try:
+        for i, (заголовок, задача) in enumerate(zip(список_заголовков, задачи), 1):
+            текущий_пост = i
+            прогресс = (i / количество_постов) * 100
+            logging.info(f"Генерация поста {i}/{количество_постов} ({прогресс:.1f}%): '{заголовок}' на языке {язык_поста}")
+            прогресс_сообщения.update(translations[язык]["generating"].format(i=i, post_count=количество_постов, progress=прогресс))
+            контент, хэштеги, промпт_изображения, данные_изображения = await задача
+            if контент is None or хэштеги is None:
+                прогресс_сообщения.update(translations[язык]["post_error"].format(title=заголовок, progress=прогресс))
+                continue
+            file_id, post_message_id = await publish_post(flux_api, chat_id, заголовок, контент, хэштеги, промпт_изображения, данные_изображения)
+            if post_message_id:
+                опубликовано += 1
+                прогресс_сообщения.update(translations[язык]["post_done"].format(title=заголовок, i=i, post_count=количество_постов, progress=прогресс))
+            else:
+                прогресс_сообщения.update(translations[язык]["post_error"].format(title=заголовок, progress=прогресс))
+    finally:
+        # Если публикацию прервали, не оставляем генерацию работать впустую
+        for задача in задачи:
+            задача.cancel()
+    await прогресс_сообщения.close(translations[язык]["generation_complete"])
+    return опубликовано
+
+async def process_update(chat_id, обновление, open_router_api, flux_api, content_generator, session):
+    """Обрабатывает одно обновление Telegram для указанного чата."""
+    await state_store.load(chat_id)
+    текст = обновление.get("message", {}).get("text", "").strip()
+    данные_коллбэка = обновление.get("callback_query", {}).get("data")
+    язык = current_language.get(chat_id, "en")
+    главное_меню = get_main_menu(язык)
+    план_подписки, количество_постов = await check_subscription(chat_id)
+
+    logging.info(f"Получено обновление: chat_id={chat_id}, текст={текст}, коллбэк={данные_коллбэка}, язык={язык}")
+
+    if текст == "/start":
+        current_language[chat_id] = "en"  # Язык по умолчанию
+        awaiting_theme.pop(chat_id, None)
+        awaiting_generate.pop(chat_id, None)
+        awaiting_channel.pop(chat_id, None)
+        awaiting_payment.pop(chat_id, None)
+        generate_image_flag[chat_id] = True
+        await send_telegram_message(chat_id, translations["en"]["welcome"], get_main_menu("en"))
+        return
 
-async def handle_updates(open_router_api, flux_api):
-    """Основной цикл обработки обновлений от Telegram."""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
-    смещение = 0
-    await setup_database()
-    последнее_проверка = None
+    if текст == "/help":
+        await send_telegram_message(chat_id, instructions[язык]["full_instruction"], главное_меню)
+        return
 
-    async with aiohttp.ClientSession() as session:
-        while True:
+    if данные_коллбэка == "more":
+        await send_telegram_message(chat_id, "Больше крутых функций! 👇", get_more_menu(язык))
+        return
+
+    if данные_коллбэка == "back_to_main":
+        awaiting_theme.pop(chat_id, None)
+        awaiting_generate.pop(chat_id, None)
+        awaiting_channel.pop(chat_id, None)
+        await send_telegram_message(chat_id, translations[язык]["main_menu"], главное_меню)
+        return
+
+    if данные_коллбэка == "language":
+        await send_telegram_message(chat_id, translations[язык]["language_prompt"], language_menu)
+        return
+
+    if данные_коллбэка and данные_коллбэка.startswith("lang_"):
+        язык = данные_коллбэка.split("_")[1]
+        current_language[chat_id] = язык
+        awaiting_theme.pop(chat_id, None)
+        awaiting_generate.pop(chat_id, None)
+        awaiting_channel.pop(chat_id, None)
+        await send_telegram_message(chat_id, translations[язык]["welcome"], get_main_menu(язык))
+        return
+
+    if данные_коллбэка == "about":
+        await send_telegram_message(chat_id, instructions[язык]["full_instruction"], главное_меню)
+        return
+
+    if данные_коллбэка == "settheme" or текст == "/settheme":
+        awaiting_theme[chat_id] = True
+        logging.info(f"Установлено awaiting_theme[{chat_id}] = True")
+        await send_telegram_message(chat_id, translations[язык]["theme_prompt"], главное_меню)
+        return
+
+    if chat_id in awaiting_theme and текст and текст != "/settheme":
+        logging.info(f"Обработка темы: {текст} для chat_id={chat_id}")
+        try:
+            части = текст.split("#", 1)
+            if len(части) != 2:
+                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+                return
+            try:
+                количество_постов = int(части[0].strip())
+            except ValueError:
+                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+                return
+            тема = части[1].strip()
+            if количество_постов <= 0 or not тема:
+                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+                return
+
+            # Определяем язык темы с помощью langdetect
+            try:
+                язык_темы = detect(тема)
+                logging.info(f"Определен язык темы для генерации: {язык_темы}")
+                # Используем язык темы, если он поддерживается, иначе текущий язык пользователя
+                язык_поста = язык_темы if язык_темы in ["ru", "en"] else язык
+            except Exception as e:
+                logging.error(f"Ошибка при определении языка: {e}")
+                язык_поста = язык  # Используем текущий язык пользователя как запасной вариант
+
+            стиль = current_style.get(chat_id, "expert")
+            await save_client_settings(chat_id, theme=тема, post_count=количество_постов, language=язык_поста)
+            await save_usage_stat(chat_id, "тема_установлена")
+            await send_telegram_message(chat_id, translations[язык]["theme_saved"].format(theme=тема, post_count=количество_постов), главное_меню)
+            del awaiting_theme[chat_id]
+        except Exception as e:
+            logging.error(f"Ошибка обработки темы: {e}")
+            await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+        return
+
+    if данные_коллбэка == "setstyle" or текст == "/setstyle":
+        if план_подписки == "standard":
+            current_style[chat_id] = "expert"
+            await send_telegram_message(chat_id, translations[язык]["style_limited"], главное_меню)
+        else:
+            await send_telegram_message(chat_id, translations[язык]["style_prompt"], get_style_menu(язык))
+        return
+
+    if данные_коллбэка and данные_коллбэка.startswith("style_"):
+        стиль = данные_коллбэка.split("_")[1]
+        if план_подписки == "standard" and стиль != "expert":
+            await send_telegram_message(chat_id, translations[язык]["style_limited"], главное_меню)
+        else:
+            current_style[chat_id] = стиль
+            await save_usage_stat(chat_id, f"стиль_установлен_{стиль}")
+            await send_telegram_message(chat_id, f"Стиль '{стиль}' установлен!", главное_меню)
+        return
+
+    if данные_коллбэка == "setchannel" or текст == "/setchannel":
+        awaiting_channel[chat_id] = True
+        await send_telegram_message(chat_id, translations[язык]["channel_prompt"].format(channel="ВашКанал"), главное_меню)
+        return
+
+    if chat_id in awaiting_channel and текст and текст != "/setchannel":
+        channel_id = текст.strip()
+        if not channel_id.startswith("@"):
+            await send_telegram_message(chat_id, translations[язык]["channel_error"], главное_меню)
+        else:
+            if not await check_channel_exists(channel_id):
+                await send_telegram_message(chat_id, translations[язык]["channel_not_found"].format(channel=channel_id), главное_меню)
+            elif await check_admin_rights(TELEGRAM_BOT_TOKEN, channel_id):
+                await save_client_settings(chat_id, channel_id=channel_id)
+                await save_usage_stat(chat_id, "канал_установлен")
+                await send_telegram_message(chat_id, translations[язык]["channel_saved"].format(channel=channel_id), главное_меню)
+                del awaiting_channel[chat_id]
+            else:
+                ссылка_канала = f"tg://resolve?domain={channel_id[1:]}"
+                подсказка = (
+                    translations[язык]["channel_no_admin"].format(channel=channel_id) + "\n\n"
+                    f"Перейдите в [{channel_id}]({ссылка_канала}), выберите 'Администраторы' > 'Добавить', и добавьте меня!"
+                )
+                await send_telegram_message(chat_id, подсказка, главное_меню)
+        return
+
+    if данные_коллбэка == "subscribe" or текст == "/subscribe":
+        await send_telegram_message(chat_id, translations[язык]["subscribe_prompt"], get_subscription_menu(язык))
+        return
+
+    if данные_коллбэка == "generate" or текст == "/generate":
+        generate_image_flag[chat_id] = True
+        настройки = await get_client_settings(chat_id)
+        if not настройки or not настройки["theme"] or not настройки["post_count"]:
+            awaiting_generate[chat_id] = True
+            await send_telegram_message(chat_id, translations[язык]["theme_prompt"], главное_меню)
+        else:
+            стиль = current_style.get(chat_id, "expert")
+            количество_постов = настройки["post_count"]
+            тема = настройки["theme"]
+            язык_поста = настройки.get("language", язык)
+            logging.info(f"Генерация постов на языке: {язык_поста}")
+            # Пакет, который уже опубликован, генерируется заново в обход кэша, иначе
+            # вернулись бы те же посты; после неудачи повтор берет ответы из кэша
+            ключ_пакета = [тема, количество_постов, стиль, язык_поста]
+            использовать_кэш = published_batch.get(chat_id) != ключ_пакета
+            message_id = await send_telegram_message(chat_id, translations[язык]["generating"].format(i=1, post_count=количество_постов, progress=0), главное_меню)
+            список_заголовков, готовые_посты = await plan_batch(open_router_api, content_generator, тема, количество_постов, стиль, язык_поста, session, use_cache=использовать_кэш)
+            if not список_заголовков:
+                await edit_telegram_message(chat_id, message_id, translations[язык]["titles_error"], главное_меню)
+                awaiting_generate.pop(chat_id, None)
+                return
+            if await generate_batch(open_router_api, flux_api, список_заголовков, количество_постов, тема, стиль, chat_id, язык, язык_поста, True, message_id, главное_меню, session, готовые_посты, use_cache=использовать_кэш):
+                published_batch[chat_id] = ключ_пакета
+            awaiting_generate.pop(chat_id, None)
+            awaiting_theme.pop(chat_id, None)
+            awaiting_channel.pop(chat_id, None)
+        return
+
+    if данные_коллбэка == "generate_text_only":
+        generate_image_flag[chat_id] = False
+        настройки = await get_client_settings(chat_id)
+        if not настройки or not настройки["theme"] or not настройки["post_count"]:
+            awaiting_generate[chat_id] = True
+            await send_telegram_message(chat_id, translations[язык]["theme_prompt"], главное_меню)
+        else:
+            стиль = current_style.get(chat_id, "expert")
+            количество_постов = настройки["post_count"]
+            тема = настройки["theme"]
+            язык_поста = настройки.get("language", язык)
+            logging.info(f"Генерация постов на языке: {язык_поста}")
+            # Пакет, который уже опубликован, генерируется заново в обход кэша, иначе
+            # вернулись бы те же посты; после неудачи повтор берет ответы из кэша
+            ключ_пакета = [тема, количество_постов, стиль, язык_поста]
+            использовать_кэш = published_batch.get(chat_id) != ключ_пакета
+            message_id = await send_telegram_message(chat_id, translations[язык]["generating"].format(i=1, post_count=количество_постов, progress=0), главное_меню)
+            список_заголовков, готовые_посты = await plan_batch(open_router_api, content_generator, тема, количество_постов, стиль, язык_поста, session, use_cache=использовать_кэш)
+            if not список_заголовков:
+                await edit_telegram_message(chat_id, message_id, translations[язык]["titles_error"], главное_меню)
+                awaiting_generate.pop(chat_id, None)
+                return
+            if await generate_batch(open_router_api, flux_api, список_заголовков, количество_постов, тема, стиль, chat_id, язык, язык_поста, False, message_id, главное_меню, session, готовые_посты, use_cache=использовать_кэш):
+                published_batch[chat_id] = ключ_пакета
+            awaiting_generate.pop(chat_id, None)
+            awaiting_theme.pop(chat_id, None)
+            awaiting_channel.pop(chat_id, None)
+        return
+
+    if chat_id in awaiting_generate and текст and текст != "/generate" and текст != "/generate_text_only":
+        try:
+            части = текст.split("#", 1)
+            if len(части) != 2:
+                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+                return
             try:
-                сейчас = datetime.now(timezone.utc)
-                if not последнее_проверка or (сейчас - последнее_проверка > timedelta(minutes=5)):
-                    await check_schedule(TELEGRAM_BOT_TOKEN, session)
-                    последнее_проверка = сейчас
-
-                async with session.get(url, params={"offset": смещение, "timeout": 30}) as response:
-                    данные = await response.json()
-                    if not данные.get("ok"):
-                        logging.error(f"Ошибка API Telegram: {данные}")
-                        await asyncio.sleep(5)
-                        continue
-
-                    обновления = данные.get("result", [])
-                    if not обновления:
-                        await asyncio.sleep(1)
-                        continue
-
-                    for обновление in обновления:
-                        смещение = обновление["update_id"] + 1
-                        chat_id = обновление.get("message", {}).get("chat", {}).get("id") or обновление.get("callback_query", {}).get("message", {}).get("chat", {}).get("id")
-                        if not chat_id:
-                            continue
-
-                        текст = обновление.get("message", {}).get("text", "").strip()
-                        данные_коллбэка = обновление.get("callback_query", {}).get("data")
-                        язык = current_language.get(chat_id, "en")
-                        главное_меню = get_main_menu(язык)
-                        план_подписки, количество_постов = await check_subscription(chat_id)
-
-                        logging.info(f"Получено обновление: chat_id={chat_id}, текст={текст}, коллбэк={данные_коллбэка}, язык={язык}")
-
-                        if текст == "/start":
-                            current_language[chat_id] = "en"  # Язык по умолчанию
-                            awaiting_theme.pop(chat_id, None)
-                            awaiting_generate.pop(chat_id, None)
-                            awaiting_channel.pop(chat_id, None)
-                            awaiting_payment.pop(chat_id, None)
-                            generate_image_flag[chat_id] = True
-                            await send_telegram_message(chat_id, translations["en"]["welcome"], get_main_menu("en"), session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if текст == "/help":
-                            await send_telegram_message(chat_id, instructions[язык]["full_instruction"], главное_меню, session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "more":
-                            await send_telegram_message(chat_id, "Больше крутых функций! 👇", get_more_menu(язык), session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "back_to_main":
-                            awaiting_theme.pop(chat_id, None)
-                            awaiting_generate.pop(chat_id, None)
-                            awaiting_channel.pop(chat_id, None)
-                            await send_telegram_message(chat_id, translations[язык]["main_menu"], главное_меню, session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "language":
-                            await send_telegram_message(chat_id, translations[язык]["language_prompt"], language_menu, session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка and данные_коллбэка.startswith("lang_"):
-                            язык = данные_коллбэка.split("_")[1]
-                            current_language[chat_id] = язык
-                            awaiting_theme.pop(chat_id, None)
-                            awaiting_generate.pop(chat_id, None)
-                            awaiting_channel.pop(chat_id, None)
-                            await send_telegram_message(chat_id, translations[язык]["welcome"], get_main_menu(язык), session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "about":
-                            await send_telegram_message(chat_id, instructions[язык]["full_instruction"], главное_меню, session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "settheme" or текст == "/settheme":
-                            awaiting_theme[chat_id] = True
-                            logging.info(f"Установлено awaiting_theme[{chat_id}] = True")
-                            await send_telegram_message(chat_id, translations[язык]["theme_prompt"], главное_меню, session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if chat_id in awaiting_theme and текст and текст != "/settheme":
-                            logging.info(f"Обработка темы: {текст} для chat_id={chat_id}")
-                            try:
-                                части = текст.split("#", 1)
-                                if len(части) != 2:
-                                    await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                try:
-                                    количество_постов = int(части[0].strip())
-                                except ValueError:
-                                    await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                тема = части[1].strip()
-                                if количество_постов <= 0 or not тема:
-                                    await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                
-                                # Определяем язык темы с помощью langdetect
-                                try:
-                                    язык_темы = detect(тема)
-                                    logging.info(f"Определен язык темы для генерации: {язык_темы}")
-                                    # Используем язык темы, если он поддерживается, иначе текущий язык пользователя
-                                    язык_поста = язык_темы if язык_темы in ["ru", "en"] else язык
-                                except Exception as e:
-                                    logging.error(f"Ошибка при определении языка: {e}")
-                                    язык_поста = язык  # Используем текущий язык пользователя как запасной вариант
-                                
-                                стиль = current_style.get(chat_id, "expert")
-                                await save_client_settings(chat_id, theme=тема, post_count=количество_постов, language=язык_поста)
-                                await save_usage_stat(chat_id, "тема_установлена")
-                                await send_telegram_message(chat_id, translations[язык]["theme_saved"].format(theme=тема, post_count=количество_постов), главное_меню, session)
-                                del awaiting_theme[chat_id]
-                                await asyncio.sleep(0.1)
-                            except Exception as e:
-                                logging.error(f"Ошибка обработки темы: {e}")
-                                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "setstyle" or текст == "/setstyle":
-                            if план_подписки == "standard":
-                                current_style[chat_id] = "expert"
-                                await send_telegram_message(chat_id, translations[язык]["style_limited"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            else:
-                                await send_telegram_message(chat_id, translations[язык]["style_prompt"], get_style_menu(язык), session)
-                                await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка and данные_коллбэка.startswith("style_"):
-                            стиль = данные_коллбэка.split("_")[1]
-                            if план_подписки == "standard" and стиль != "expert":
-                                await send_telegram_message(chat_id, translations[язык]["style_limited"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            else:
-                                current_style[chat_id] = стиль
-                                await save_usage_stat(chat_id, f"стиль_установлен_{стиль}")
-                                await send_telegram_message(chat_id, f"Стиль '{стиль}' установлен!", главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "setchannel" or текст == "/setchannel":
-                            awaiting_channel[chat_id] = True
-                            await send_telegram_message(chat_id, translations[язык]["channel_prompt"].format(channel="ВашКанал"), главное_меню, session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if chat_id in awaiting_channel and текст and текст != "/setchannel":
-                            channel_id = текст.strip()
-                            if not channel_id.startswith("@"):
-                                await send_telegram_message(chat_id, translations[язык]["channel_error"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            else:
-                                if not await check_channel_exists(channel_id, session):
-                                    await send_telegram_message(chat_id, translations[язык]["channel_not_found"].format(channel=channel_id), главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                elif await check_admin_rights(TELEGRAM_BOT_TOKEN, channel_id, session):
-                                    await save_client_settings(chat_id, channel_id=channel_id)
-                                    await save_usage_stat(chat_id, "канал_установлен")
-                                    await send_telegram_message(chat_id, translations[язык]["channel_saved"].format(channel=channel_id), главное_меню, session)
-                                    del awaiting_channel[chat_id]
-                                    await asyncio.sleep(0.1)
-                                else:
-                                    ссылка_канала = f"tg://resolve?domain={channel_id[1:]}"
-                                    подсказка = (
-                                        translations[язык]["channel_no_admin"].format(channel=channel_id) + "\n\n"
-                                        f"Перейдите в [{channel_id}]({ссылка_канала}), выберите 'Администраторы' > 'Добавить', и добавьте меня!"
-                                    )
-                                    await send_telegram_message(chat_id, подсказка, главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "subscribe" or текст == "/subscribe":
-                            await send_telegram_message(chat_id, translations[язык]["subscribe_prompt"], get_subscription_menu(язык), session)
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "generate" or текст == "/generate":
-                            generate_image_flag[chat_id] = True
-                            настройки = await get_client_settings(chat_id)
-                            if not настройки or not настройки["theme"] or not настройки["post_count"]:
-                                awaiting_generate[chat_id] = True
-                                await send_telegram_message(chat_id, translations[язык]["theme_prompt"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            else:
-                                стиль = current_style.get(chat_id, "expert")
-                                количество_постов = настройки["post_count"]
-                                тема = настройки["theme"]
-                                язык_поста = настройки.get("language", язык)
-                                logging.info(f"Генерация постов на языке: {язык_поста}")
-                                message_id = await send_telegram_message(chat_id, translations[язык]["generating"].format(i=1, post_count=количество_постов, progress=0), главное_меню, session)
-                                заголовки = await open_router_api.generate_titles(тема, количество_постов, language=язык_поста, session=session)
-                                if not заголовки:
-                                    await edit_telegram_message(chat_id, message_id, translations[язык]["titles_error"], главное_меню, session)
-                                    awaiting_generate.pop(chat_id, None)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                список_заголовков = заголовки.split("\n")
-                                for i, заголовок in enumerate(список_заголовков, 1):
-                                    прогресс = (i / количество_постов) * 100
-                                    logging.info(f"Генерация поста {i}/{количество_постов} ({прогресс:.1f}%): '{заголовок}' на языке {язык_поста}")
-                                    await edit_telegram_message(chat_id, message_id, translations[язык]["generating"].format(i=i, post_count=количество_постов, progress=прогресс), главное_меню, session)
-                                    контент, хэштеги, file_id, промпт_изображения, post_message_id = await generate_post(open_router_api, flux_api, заголовок, тема, стиль, chat_id, план_подписки, язык_поста, True, session=session)
-                                    if контент is None or хэштеги is None:
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_error"].format(title=заголовок, progress=прогресс), главное_меню, session)
-                                        continue
-                                    if post_message_id:
-                                        await save_post_result(chat_id, заголовок, контент, хэштеги, file_id, промпт_изображения, post_message_id)
-                                        await save_usage_stat(chat_id, "пост_сгенерирован")
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_done"].format(title=заголовок, i=i, post_count=количество_постов, progress=прогресс), главное_меню, session)
-                                    else:
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_error"].format(title=заголовок, progress=прогресс), главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                await edit_telegram_message(chat_id, message_id, translations[язык]["generation_complete"], главное_меню, session)
-                                awaiting_generate.pop(chat_id, None)
-                                awaiting_theme.pop(chat_id, None)
-                                awaiting_channel.pop(chat_id, None)
-                                await asyncio.sleep(0.1)
-                            continue
-
-                        if данные_коллбэка == "generate_text_only":
-                            generate_image_flag[chat_id] = False
-                            настройки = await get_client_settings(chat_id)
-                            if not настройки or not настройки["theme"] or not настройки["post_count"]:
-                                awaiting_generate[chat_id] = True
-                                await send_telegram_message(chat_id, translations[язык]["theme_prompt"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            else:
-                                стиль = current_style.get(chat_id, "expert")
-                                количество_постов = настройки["post_count"]
-                                тема = настройки["theme"]
-                                язык_поста = настройки.get("language", язык)
-                                logging.info(f"Генерация постов на языке: {язык_поста}")
-                                message_id = await send_telegram_message(chat_id, translations[язык]["generating"].format(i=1, post_count=количество_постов, progress=0), главное_меню, session)
-                                заголовки = await open_router_api.generate_titles(тема, количество_постов, language=язык_поста, session=session)
-                                if not заголовки:
-                                    await edit_telegram_message(chat_id, message_id, translations[язык]["titles_error"], главное_меню, session)
-                                    awaiting_generate.pop(chat_id, None)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                список_заголовков = заголовки.split("\n")
-                                for i, заголовок in enumerate(список_заголовков, 1):
-                                    прогресс = (i / количество_постов) * 100
-                                    logging.info(f"Генерация поста {i}/{количество_постов} ({прогресс:.1f}%): '{заголовок}' на языке {язык_поста}")
-                                    await edit_telegram_message(chat_id, message_id, translations[язык]["generating"].format(i=i, post_count=количество_постов, progress=прогресс), главное_меню, session)
-                                    контент, хэштеги, file_id, промпт_изображения, post_message_id = await generate_post(open_router_api, flux_api, заголовок, тема, стиль, chat_id, план_подписки, язык_поста, False, session=session)
-                                    if контент is None or хэштеги is None:
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_error"].format(title=заголовок, progress=прогресс), главное_меню, session)
-                                        continue
-                                    if post_message_id:
-                                        await save_post_result(chat_id, заголовок, контент, хэштеги, file_id, промпт_изображения, post_message_id)
-                                        await save_usage_stat(chat_id, "пост_сгенерирован")
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_done"].format(title=заголовок, i=i, post_count=количество_постов, progress=прогресс), главное_меню, session)
-                                    else:
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_error"].format(title=заголовок, progress=прогресс), главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                await edit_telegram_message(chat_id, message_id, translations[язык]["generation_complete"], главное_меню, session)
-                                awaiting_generate.pop(chat_id, None)
-                                awaiting_theme.pop(chat_id, None)
-                                awaiting_channel.pop(chat_id, None)
-                                await asyncio.sleep(0.1)
-                            continue
-
-                        if chat_id in awaiting_generate and текст and текст != "/generate" and текст != "/generate_text_only":
-                            try:
-                                части = текст.split("#", 1)
-                                if len(части) != 2:
-                                    await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                try:
-                                    количество_постов = int(части[0].strip())
-                                except ValueError:
-                                    await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                тема = части[1].strip()
-                                if количество_постов <= 0 or not тема:
-                                    await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                
-                                # Определяем язык темы с помощью langdetect
-                                try:
-                                    язык_темы = detect(тема)
-                                    logging.info(f"Определен язык темы для генерации: {язык_темы}")
-                                    # Используем язык темы, если он поддерживается, иначе текущий язык пользователя
-                                    язык_поста = язык_темы if язык_темы in ["ru", "en"] else язык
-                                except Exception as e:
-                                    logging.error(f"Ошибка при определении языка: {e}")
-                                    язык_поста = язык  # Используем текущий язык пользователя как запасной вариант
-                                
-                                стиль = current_style.get(chat_id, "expert")
-                                message_id = await send_telegram_message(chat_id, translations[язык]["generating"].format(i=1, post_count=количество_постов, progress=0), главное_меню, session)
-                                заголовки = await open_router_api.generate_titles(тема, количество_постов, language=язык_поста, session=session)
-                                if not заголовки:
-                                    await edit_telegram_message(chat_id, message_id, translations[язык]["titles_error"], главное_меню, session)
-                                    awaiting_generate.pop(chat_id, None)
-                                    await asyncio.sleep(0.1)
-                                    continue
-                                список_заголовков = заголовки.split("\n")
-                                for i, заголовок in enumerate(список_заголовков, 1):
-                                    прогресс = (i / количество_постов) * 100
-                                    logging.info(f"Генерация поста {i}/{количество_постов} ({прогресс:.1f}%): '{заголовок}' на языке {язык_поста}")
-                                    await edit_telegram_message(chat_id, message_id, translations[язык]["generating"].format(i=i, post_count=количество_постов, progress=прогресс), главное_меню, session)
-                                    контент, хэштеги, file_id, промпт_изображения, post_message_id = await generate_post(open_router_api, flux_api, заголовок, тема, стиль, chat_id, план_подписки, язык_поста, generate_image_flag.get(chat_id, True), session=session)
-                                    if контент is None or хэштеги is None:
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_error"].format(title=заголовок, progress=прогресс), главное_меню, session)
-                                        continue
-                                    if post_message_id:
-                                        await save_post_result(chat_id, заголовок, контент, хэштеги, file_id, промпт_изображения, post_message_id)
-                                        await save_usage_stat(chat_id, "пост_сгенерирован")
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_done"].format(title=заголовок, i=i, post_count=количество_постов, progress=прогресс), главное_меню, session)
-                                    else:
-                                        await edit_telegram_message(chat_id, message_id, translations[язык]["post_error"].format(title=заголовок, progress=прогресс), главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                                await edit_telegram_message(chat_id, message_id, translations[язык]["generation_complete"], главное_меню, session)
-                                del awaiting_generate[chat_id]
-                                awaiting_theme.pop(chat_id, None)
-                                awaiting_channel.pop(chat_id, None)
-                                await asyncio.sleep(0.1)
-                            except Exception as e:
-                                logging.error(f"Ошибка обработки темы: {e}")
-                                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            continue
-
-                        if текст.startswith("/setschedule"):
-                            настройки = await get_client_settings(chat_id)
-                            if not настройки or not настройки["channel_id"]:
-                                await send_telegram_message(chat_id, translations[язык]["no_channel"], главное_меню, session)
-                                await asyncio.sleep(0.1)
-                                continue
-                            if "\n" in текст:
-                                части = текст.split("\n")
-                                if len(части) != настройки["post_count"] + 2 or not части[1].startswith("@"):
-                                    await send_telegram_message(chat_id, translations[язык]["schedule_format_error"].format(post_count=настройки["post_count"]), главное_меню, session)
-                                    continue
-                                channel_id = части[1].strip()
-                                await save_client_settings(chat_id, channel_id=channel_id)
-                                post_ids = []
-                                try:
-                                    async with aiosqlite.connect("telegram_bot_data.db", timeout=10) as db:
-                                        async with db.execute("""
-                                            SELECT post_id FROM posts
-                                            WHERE chat_id = ?
-                                            ORDER BY created_at DESC
-                                            LIMIT ?
-                                        """, (chat_id, настройки["post_count"])) as cursor:
-                                            строки = await cursor.fetchall()
-                                            post_ids = [строка[0] for строка in строки]
-                                    for i, строка in enumerate(части[2:]):
-                                        try:
-                                            дата_публикации = datetime.strptime(строка.strip(), "%d.%m.%Y %H:%M").replace(tzinfo=timezone.utc)
-                                            await save_schedule(chat_id, channel_id, post_ids[i], дата_публикации)
-                                            await save_usage_stat(chat_id, "расписание_установлено")
-                                            await asyncio.sleep(0.1)
-                                        except ValueError:
-                                            await send_telegram_message(chat_id, translations[язык]["schedule_date_error"].format(line=строка), главное_меню, session)
-                                            await asyncio.sleep(0.1)
-                                            break
-                                    else:
-                                        await send_telegram_message(chat_id, translations[язык]["schedule_saved"].format(channel_id=channel_id), главное_меню, session)
-                                        await asyncio.sleep(0.1)
-                                except Exception as e:
-                                    logging.error(f"Ошибка в /setschedule: {e}")
-                                    await send_telegram_message(chat_id, "Ошибка при сохранении расписания", главное_меню, session)
-                                    await asyncio.sleep(0.1)
-                            else:
-                                await send_telegram_message(chat_id, translations[язык]["schedule_prompt"].format(post_count=настройки["post_count"]), главное_меню, session)
-                                await asyncio.sleep(0.1)
-                            continue
+                количество_постов = int(части[0].strip())
+            except ValueError:
+                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+                return
+            тема = части[1].strip()
+            if количество_постов <= 0 or not тема:
+                await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+                return
+
+            # Определяем язык темы с помощью langdetect
+            try:
+                язык_темы = detect(тема)
+                logging.info(f"Определен язык темы для генерации: {язык_темы}")
+                # Используем язык темы, если он поддерживается, иначе текущий язык пользователя
+                язык_поста = язык_темы if язык_темы in ["ru", "en"] else язык
+            except Exception as e:
+                logging.error(f"Ошибка при определении языка: {e}")
+                язык_поста = язык  # Используем текущий язык пользователя как запасной вариант
+
+            стиль = current_style.get(chat_id, "expert")
+            # Пакет, который уже опубликован, генерируется заново в обход кэша, иначе
+            # вернулись бы те же посты; после неудачи повтор берет ответы из кэша
+            ключ_пакета = [тема, количество_постов, стиль, язык_поста]
+            использовать_кэш = published_batch.get(chat_id) != ключ_пакета
+            message_id = await send_telegram_message(chat_id, translations[язык]["generating"].format(i=1, post_count=количество_постов, progress=0), главное_меню)
+            список_заголовков, готовые_посты = await plan_batch(open_router_api, content_generator, тема, количество_постов, стиль, язык_поста, session, use_cache=использовать_кэш)
+            if not список_заголовков:
+                await edit_telegram_message(chat_id, message_id, translations[язык]["titles_error"], главное_меню)
+                awaiting_generate.pop(chat_id, None)
+                return
+            if await generate_batch(open_router_api, flux_api, список_заголовков, количество_постов, тема, стиль, chat_id, язык, язык_поста, generate_image_flag.get(chat_id, True), message_id, главное_меню, session, готовые_посты, use_cache=использовать_кэш):
+                published_batch[chat_id] = ключ_пакета
+            del awaiting_generate[chat_id]
+            awaiting_theme.pop(chat_id, None)
+            awaiting_channel.pop(chat_id, None)
+        except Exception as e:
+            logging.error(f"Ошибка обработки темы: {e}")
+            await send_telegram_message(chat_id, translations[язык]["theme_error"], главное_меню)
+        return
 
+    if текст.startswith("/setschedule"):
+        настройки = await get_client_settings(chat_id)
+        if not настройки or not настройки["channel_id"]:
+            await send_telegram_message(chat_id, translations[язык]["no_channel"], главное_меню)
+            return
+        if "\n" in текст:
+            части = текст.split("\n")
+            if len(части) != настройки["post_count"] + 2 or not части[1].startswith("@"):
+                await send_telegram_message(chat_id, translations[язык]["schedule_format_error"].format(post_count=настройки["post_count"]), главное_меню)
+                return
+            channel_id = части[1].strip()
+            await save_client_settings(chat_id, channel_id=channel_id)
+            post_ids = []
+            try:
+                post_ids = await get_recent_post_ids(chat_id, настройки["post_count"])
+                for i, строка in enumerate(части[2:]):
+                    try:
+                        дата_публикации = datetime.strptime(строка.strip(), "%d.%m.%Y %H:%M").replace(tzinfo=timezone.utc)
+                        await save_schedule(chat_id, channel_id, post_ids[i], дата_публикации)
+                        await save_usage_stat(chat_id, "расписание_установлено")
+                    except ValueError:
+                        await send_telegram_message(chat_id, translations[язык]["schedule_date_error"].format(line=строка), главное_меню)
+                        break
+                else:
+                    await send_telegram_message(chat_id, translations[язык]["schedule_saved"].format(channel_id=channel_id), главное_меню)
             except Exception as e:
-                logging.error(f"Ошибка в обработке обновлений: {e}")
+                logging.error(f"Ошибка в /setschedule: {e}")
+                await send_telegram_message(chat_id, "Ошибка при сохранении расписания", главное_меню)
+        else:
+            await send_telegram_message(chat_id, translations[язык]["schedule_prompt"].format(post_count=настройки["post_count"]), главное_меню)
+        return
+
+
+async def poll_updates(dispatcher):
+    """Получает обновления через getUpdates (long polling) и передает их диспетчеру."""
+    telegram = get_telegram_client()
+    смещение = 0
+    await delete_webhook()  # Пока установлен webhook, getUpdates не работает
+    while True:
+        try:
+            # Долгий опрос: запрос висит до 30 секунд, пока не появятся обновления
+            данные = await telegram.call("getUpdates", {"offset": смещение, "timeout": 30, "allowed_updates": ALLOWED_UPDATES}, limited=False, attempts=1, timeout=40)
+            if not данные or not данные.get("ok"):
+                logging.error(f"Ошибка API Telegram: {данные}")
                 await asyncio.sleep(5)
+                continue
+
+            for обновление in данные.get("result", []):
+                chat_id = update_chat_id(обновление)
+                # Обновления одного чата идут по порядку, разные чаты — параллельно.
+                # dispatch не ждет места в очереди, поэтому занятый чат не задерживает опрос
+                if chat_id and not dispatcher.dispatch(chat_id, обновление):
+                    язык = current_language.get(chat_id, "en")
+                    asyncio.create_task(send_telegram_message(chat_id, translations[язык]["busy"]))
+                смещение = обновление["update_id"] + 1
+
+        except Exception as e:
+            logging.error(f"Ошибка в обработке обновлений: {e}")
+            await asyncio.sleep(5)
+
+async def run_webhook(секрет):
+    """
+    Регистрирует webhook и ждет остановки. Обновления принимает HTTP-сервер
+    бота (маршрут добавлен через add_webhook_routes) и передает диспетчеру.
+    """
+    while not await set_webhook(WEBHOOK_URL, секрет):
+        await asyncio.sleep(30)
+    # Webhook не удаляется при остановке: при перезапуске на Render новый экземпляр
+    # уже установил свой, и удаление оставило бы бота без обновлений
+    await asyncio.Event().wait()
+
+async def schedule_task():
+    """Периодически публикует запланированные посты."""
+    while True:
+        await check_schedule(TELEGRAM_BOT_TOKEN)
+        await asyncio.sleep(SCHEDULE_CHECK_INTERVAL)
+
+async def handle_updates(open_router_api, flux_api, content_generator, use_webhook=False):
+    """Основной цикл обработки обновлений от Telegram: через webhook или getUpdates."""
+    await setup_database()
+
+    async with aiohttp.ClientSession() as session:
+        async def обработчик(chat_id, обновление):
+            await process_update(chat_id, обновление, open_router_api, flux_api, content_generator, session)
+
+        dispatcher = UpdateDispatcher(обработчик)
+        # Проверки Render, метрики и, в режиме webhook, прием обновлений — на одном сервере
+        сервер = HealthServer(dispatcher=dispatcher, open_router_api=open_router_api, flux_api=flux_api, state_store=state_store)
+        секрет = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        if use_webhook:
+            add_webhook_routes(сервер.app, dispatcher.dispatch, секрет)
+        await сервер.start()
+        задача_расписания = asyncio.create_task(schedule_task())
+        try:
+            if use_webhook:
+                await run_webhook(секрет)
+            else:
+                await poll_updates(dispatcher)
+        finally:
+            задача_расписания.cancel()
+            await сервер.stop()
+            await dispatcher.shutdown()
 
 async def cleanup_task():
     """Задача для очистки старых записей из базы данных."""
@@ -717,19 +802,31 @@ async def cleanup_task():
 
 async def main():
     """Основная функция бота."""
+    content_generator = None
     try:
-        # Запускаем веб-сервер для Render.com в отдельном потоке
-        threading.Thread(target=start_webserver, daemon=True).start()
-        logger.info("Веб-сервер для Render.com запущен")
-        
+        use_webhook = UPDATE_MODE == "webhook"
+        if use_webhook and not WEBHOOK_URL:
+            logger.error("UPDATE_MODE=webhook, но WEBHOOK_URL не задан: используем getUpdates")
+            use_webhook = False
+
         await setup_database()  # Инициализация базы данных
         open_router_api = OpenRouterAPI()  # Создаем экземпляр OpenRouterAPI
         flux_api = FLUX_API()    # Создаем экземпляр FLUX_API
+        content_generator = ContentGenerator(open_router_api)  # Заголовки с хеджированием между провайдерами
         задача_очистки = asyncio.create_task(cleanup_task())  # Запускаем очистку в фоне
-        await handle_updates(open_router_api, flux_api)  # Основной цикл обновлений
+        задача_состояний = asyncio.create_task(state_store.run_maintenance())  # Сохранение состояний чатов
+        await handle_updates(open_router_api, flux_api, content_generator, use_webhook)  # Основной цикл обновлений
     except Exception as e:
         logging.error(f"Критическая ошибка в main: {e}")
         raise
+    finally:
+        try:
+            await state_store.flush()
+            if content_generator:
+                await content_generator.close()
+        finally:
+            await close_telegram_clients()
+            await close_database()
 
 if __name__ == "__main__":
     try:
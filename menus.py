@@ -35,6 +35,7 @@ translations = {
         "post_error": "Uh-oh, '{title}' hit a snag. Moving on... ({progress:.1f}%)",
         "generation_complete": "Done! All posts are ready (100%)! 🎉",
         "titles_error": "Titles didn’t load. Try again?",
+        "busy": "I’m still working on your previous requests. Please wait a moment.",
         "channel_prompt": (
             "Drop your channel ID (e.g., @MyChannel).\n\n"
             "*How to add me as admin:*\n1. Go to your channel (e.g., tg://resolve?domain={channel}).\n"
@@ -89,6 +90,7 @@ translations = {
         "post_error": "Упс, с '{title}' что-то пошло не так. Продолжаю... ({progress:.1f}%)",
         "generation_complete": "Готово! Все посты на месте (100%)! 🎉",
         "titles_error": "Заголовки не загрузились. Повторить?",
+        "busy": "Еще обрабатываю ваши предыдущие запросы. Подождите немного.",
         "channel_prompt": (
             "Укажи ID канала (например, @MyChannel).\n\n"
             "*Как сделать меня админом:*\n1. Перейди в канал (например, tg://resolve?domain={channel}).\n"
@@ -144,6 +146,7 @@ translations = {
         "post_error": "Oh no, '{title}' falló. Sigo adelante... ({progress:.1f}%)",
         "generation_complete": "¡Listo! Todos los posts están hechos (100%)! 🎉",
         "titles_error": "Los títulos no cargaron. ¿Reintentar?",
+        "busy": "Todavía estoy procesando tus solicitudes anteriores. Espera un momento.",
         "channel_prompt": (
             "Dame el ID del canal (ej. @MyChannel).\n\n"
             "*Cómo hacerme admin:*\n1. Ve a tu canal (ej., tg://resolve?domain={channel}).\n"
@@ -198,6 +201,7 @@ translations = {
         "post_error": "Aïe, souci avec '{title}'. Je continue... ({progress:.1f}%)",
         "generation_complete": "Fini ! Tous les posts sont prêts (100%) ! 🎉",
         "titles_error": "Les titres n’ont pas chargé. Réessayer ?",
+        "busy": "Je traite encore vos demandes précédentes. Patientez un instant.",
         "channel_prompt": (
             "Indique l’ID du canal (ex. @MyChannel).\n\n"
             "*Comment me faire admin :*\n1. Va sur ton canal (ex., tg://resolve?domain={channel}).\n"
@@ -252,6 +256,7 @@ translations = {
         "post_error": "Ohje, '{title}' hat gehakt. Weiter geht’s... ({progress:.1f}%)",
         "generation_complete": "Fertig! Alle Posts sind bereit (100%)! 🎉",
         "titles_error": "Titel konnten nicht geladen werden. Nochmal?",
+        "busy": "Ich bearbeite noch deine vorherigen Anfragen. Bitte warte einen Moment.",
         "channel_prompt": (
             "Gib die Kanal-ID an (z.B. @MyChannel).\n\n"
             "*Wie mache ich mich zum Admin:*\n1. Geh zu deinem Kanal (z.B., tg://resolve?domain={channel}).\n"
@@ -1,9 +1,12 @@
 import os
 import logging
 import json
-import requests
+import asyncio
+import aiohttp
 import time
 from dotenv import load_dotenv
+from config import MISTRAL_MAX_CONNECTIONS
+from metrics import provider_latency
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -38,8 +41,28 @@ class MistralAPI:
             "Content-Type": "application/json"
         }
         
+        # Общая сессия с пулом keep-alive соединений, создается при первом запросе
+        self.max_connections = MISTRAL_MAX_CONNECTIONS
+        self.session = None
+        
         logging.info(f"MistralAPI инициализирован с моделью {self.model}")
     
+    async def _get_session(self):
+        """Возвращает общую сессию aiohttp, создавая ее при необходимости."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=60)  # Таймаут 60 секунд
+            )
+        return self.session
+    
+    async def close(self):
+        """Закрывает сессию и пул соединений."""
+        if self.session and not self.session.closed:
+            await self.session.close()
+    
     async def generate_text(self, prompt, system_prompt="", max_tokens=4000, temperature=0.7):
         """
         Генерация текста с использованием Mistral AI
@@ -72,37 +95,39 @@ class MistralAPI:
                 "top_p": 0.9
             }
             
-            # Делаем запрос к API с несколькими попытками в случае ошибок
+            session = await self._get_session()
+            
+            # Делаем запрос к API с несколькими попытками в случае ошибок.
+            # Ожидание не блокирует цикл событий, а отмена задачи прерывает запрос
             for attempt in range(3):
                 try:
-                    response = requests.post(
-                        self.api_url,
-                        headers=self.headers,
-                        json=payload,
-                        timeout=60  # Таймаут 60 секунд
-                    )
+                    started = time.monotonic()
+                    try:
+                        async with session.post(self.api_url, json=payload) as response:
+                            # Проверяем статус ответа
+                            if response.status == 200:
+                                result = await response.json()
+                                generated_text = result["choices"][0]["message"]["content"]
+                                logging.info(f"Успешно получен ответ от Mistral AI, длина текста: {len(generated_text)}")
+                                return generated_text
+                            response_text = await response.text()
+                    finally:
+                        provider_latency.observe(time.monotonic() - started, "mistral")
                     
-                    # Проверяем статус ответа
-                    if response.status_code == 200:
-                        result = response.json()
-                        generated_text = result["choices"][0]["message"]["content"]
-                        logging.info(f"Успешно получен ответ от Mistral AI, длина текста: {len(generated_text)}")
-                        return generated_text
+                    logging.error(f"Ошибка API Mistral: {response.status} - {response_text}")
+                    if attempt < 2:  # Если еще не последняя попытка
+                        wait_time = 5 * (attempt + 1)
+                        logging.info(f"Повторяем запрос через {wait_time} секунд...")
+                        await asyncio.sleep(wait_time)
                     else:
-                        logging.error(f"Ошибка API Mistral: {response.status_code} - {response.text}")
-                        if attempt < 2:  # Если еще не последняя попытка
-                            wait_time = 5 * (attempt + 1)
-                            logging.info(f"Повторяем запрос через {wait_time} секунд...")
-                            time.sleep(wait_time)
-                        else:
-                            return f"Ошибка генерации текста: {response.status_code}"
+                        return f"Ошибка генерации текста: {response.status}"
                 
-                except requests.exceptions.Timeout:
+                except asyncio.TimeoutError:
                     logging.error(f"Таймаут при запросе к Mistral API (попытка {attempt+1}/3)")
                     if attempt < 2:
                         wait_time = 10 * (attempt + 1)
                         logging.info(f"Повторяем запрос через {wait_time} секунд...")
-                        time.sleep(wait_time)
+                        await asyncio.sleep(wait_time)
                     else:
                         return "Ошибка генерации текста: превышено время ожидания"
                         
@@ -111,7 +136,7 @@ class MistralAPI:
                     if attempt < 2:
                         wait_time = 10 * (attempt + 1)
                         logging.info(f"Повторяем запрос через {wait_time} секунд...")
-                        time.sleep(wait_time)
+                        await asyncio.sleep(wait_time)
                     else:
                         return f"Ошибка генерации текста: {str(e)}"
         
@@ -281,8 +306,6 @@ class MistralAPI:
 
 # Тестирование класса
 if __name__ == "__main__":
-    import asyncio
-    
     async def test_mistral():
         api = MistralAPI()
         
@@ -301,4 +324,6 @@ if __name__ == "__main__":
         image_prompt = await api.generate_image_prompt(title, "Вторая мировая война", "en")
         print(f"Промпт для изображения: {image_prompt}")
         
+        await api.close()
+        
     asyncio.run(test_mistral()) 
\ No newline at end of file
@@ -0,0 +1,135 @@
+import logging
+import time
+from collections import deque
+from config import (
+    ROUTER_WINDOW_SIZE, ROUTER_WINDOW_SECONDS, ROUTER_FAILURE_THRESHOLD,
+    ROUTER_COOLDOWN, ROUTER_MAX_COOLDOWN, ROUTER_RATE_LIMIT_COOLDOWN
+)
+from metrics import provider_latency
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class ModelHealth:
+    """
+    Состояние одной модели: последние замеры задержки и ошибок и автомат
+    отключения (circuit breaker).
+
+    После failure_threshold ошибок подряд или ответа 429 модель отключается
+    на время охлаждения. По его истечении пропускается один пробный запрос:
+    успех возвращает модель в работу, ошибка отключает ее снова на вдвое
+    больший срок (не более max_cooldown).
+    """
+    def __init__(self, name, priority, window_size=ROUTER_WINDOW_SIZE, window_seconds=ROUTER_WINDOW_SECONDS):
+        self.name = name
+        self.priority = priority  # Порядок в исходном списке, используется при равенстве оценок
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=window_size)  # (время, задержка, успех)
+        self.consecutive_failures = 0
+        self.cooldown = ROUTER_COOLDOWN
+        self.open_until = 0.0  # До какого момента модель отключена
+        self.probing = False   # Выполняется пробный запрос после охлаждения
+
+    def _recent(self, now):
+        while self.samples and now - self.samples[0][0] > self.window_seconds:
+            self.samples.popleft()
+        return self.samples
+
+    def available(self, now):
+        """Можно ли сейчас отправить запрос этой модели."""
+        if now < self.open_until:
+            return False
+        # После охлаждения пропускаем только один пробный запрос
+        return not (self.open_until and self.probing)
+
+    def score(self, now):
+        """Ожидаемое время получения ответа: средняя задержка с учетом доли ошибок. Меньше — лучше."""
+        samples = self._recent(now)
+        if not samples:
+            # Модель без свежих замеров пробуем в первую очередь, чтобы обновить статистику
+            return 0.0
+        latency = sum(sample[1] for sample in samples) / len(samples)
+        success_rate = sum(1 for sample in samples if sample[2]) / len(samples)
+        return latency / max(success_rate, 0.1)
+
+    def record_success(self, latency):
+        self.samples.append((time.monotonic(), latency, True))
+        self.consecutive_failures = 0
+        self.cooldown = ROUTER_COOLDOWN
+        self.open_until = 0.0
+        self.probing = False
+
+    def record_failure(self, latency):
+        now = time.monotonic()
+        self.samples.append((now, latency, False))
+        self.consecutive_failures += 1
+        if self.probing or self.consecutive_failures >= ROUTER_FAILURE_THRESHOLD:
+            self._open(now, self.cooldown)
+            self.cooldown = min(self.cooldown * 2, ROUTER_MAX_COOLDOWN)
+
+    def record_rate_limit(self, latency):
+        now = time.monotonic()
+        self.samples.append((now, latency, False))
+        self._open(now, ROUTER_RATE_LIMIT_COOLDOWN)
+
+    def _open(self, now, seconds):
+        self.open_until = now + seconds
+        self.probing = False
+        logging.warning(f"Модель {self.name} отключена на {seconds:.0f} с")
+
+    def snapshot(self, now):
+        """Сводка состояния модели для логов и метрик."""
+        samples = self._recent(now)
+        return {
+            "available": self.available(now),
+            "score": round(self.score(now), 3),
+            "samples": len(samples),
+            "errors": sum(1 for sample in samples if not sample[2]),
+            "open_for": round(max(self.open_until - now, 0.0), 1),
+        }
+
+class ModelRouter:
+    """
+    Выбор модели для запроса по текущему состоянию.
+
+    Запрос отправляется самой быстрой из доступных моделей, отключенные
+    модели пропускаются без ожидания, поэтому неработающие модели не
+    увеличивают время ответа.
+    """
+    def __init__(self, models):
+        self.models = {name: ModelHealth(name, index) for index, name in enumerate(models)}
+
+    def candidates(self):
+        """Возвращает доступные модели, от лучшей к худшей."""
+        now = time.monotonic()
+        available = [health for health in self.models.values() if health.available(now)]
+        available.sort(key=lambda health: (health.score(now), health.priority))
+        return [health.name for health in available]
+
+    def begin(self, model_name):
+        """Отмечает начало запроса; для модели после охлаждения это пробный запрос."""
+        health = self.models[model_name]
+        if health.open_until:
+            health.probing = True
+        return time.monotonic()
+
+    def abort(self, model_name):
+        """Запрос отменен, не дойдя до результата: модель снова доступна для пробы."""
+        self.models[model_name].probing = False
+
+    def _latency(self, model_name, started):
+        latency = time.monotonic() - started
+        provider_latency.observe(latency, f"openrouter:{model_name}")
+        return latency
+
+    def record_success(self, model_name, started):
+        self.models[model_name].record_success(self._latency(model_name, started))
+
+    def record_failure(self, model_name, started):
+        self.models[model_name].record_failure(self._latency(model_name, started))
+
+    def record_rate_limit(self, model_name, started):
+        self.models[model_name].record_rate_limit(self._latency(model_name, started))
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {name: health.snapshot(now) for name, health in self.models.items()}
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from telegram_bot import edit_telegram_message
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class ProgressReporter:
+    """
+    Сообщение о прогрессе, которое обновляется в фоне.
+
+    update() не ждет Telegram: он запоминает новый текст и, если нужно,
+    запускает фоновую задачу отправки. Пока предыдущее редактирование
+    выполняется (или ждет лимита чата), промежуточные состояния заменяются
+    последним, а текст, совпадающий с уже показанным, не отправляется.
+    """
+    def __init__(self, chat_id, message_id, reply_markup=None):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.reply_markup = reply_markup
+        self._pending = None  # Последний текст, еще не отправленный
+        self._shown = None    # Текст, который сейчас в сообщении
+        self._task = None
+        self.skipped = 0      # Сколько состояний не понадобилось отправлять
+
+    def update(self, text):
+        """Запоминает новое состояние прогресса и возвращается сразу."""
+        if self.message_id is None:
+            return
+        if self._pending is not None:
+            self.skipped += 1
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, text=None):
+        """Показывает итоговое состояние и ждет, пока все изменения дойдут до Telegram."""
+        if text is not None:
+            self.update(text)
+        if self._task is not None:
+            await self._task
+
+    async def _run(self):
+        while self._pending is not None:
+            text, self._pending = self._pending, None
+            if text == self._shown:
+                self.skipped += 1
+                continue
+            try:
+                if await edit_telegram_message(self.chat_id, self.message_id, text, self.reply_markup):
+                    self._shown = text
+            except Exception as e:
+                logging.error(f"Ошибка обновления прогресса в чате {self.chat_id}: {e}")
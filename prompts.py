@@ -2,6 +2,8 @@ TITLE_PROMPT = """Generate exactly {post_count} short, unique, and engaging titl
 
 POST_PROMPT = """Write an SEO-optimized post in {style} style with the title *{title}*. Explore the event, aspect, or example from the title, based on the context of the theme '{theme}', without directly repeating the theme’s full phrasing. Use lively, emotional language, specific examples, and arguments. Length: strictly up to {max_length} characters, including the title and 3 relevant hashtags on a new line. Format: *{title}*\n\n[content]\n\n#hashtag1 #hashtag2 #hashtag3"""
 
+HASHTAG_PROMPT = """Write exactly 3 relevant hashtags for a Telegram post with the title '{title}' about the theme '{theme}', in the language with code '{language}'. Return only the hashtags separated by spaces."""
+
 IMAGE_PROMPT = """Create a concise and detailed prompt (150-200 words) for generating a photorealistic image in Flux API, perfectly reflecting the content of a post with the title '{title}' in the context of the theme '{theme}'.
 
 1. **Key scene**: Describe the main action (e.g., caravan travel, competition, protest), characters (e.g., traders, explorers, leaders), and their interactions, matching the title and historical context (e.g., 2nd century BCE, modern day).
@@ -10,4 +12,14 @@ IMAGE_PROMPT = """Create a concise and detailed prompt (150-200 words) for gener
 4. **Atmosphere**: Define the mood (e.g., adventure, tension, nostalgia), lighting (e.g., golden sunlight, spotlights, fog), and historical context.
 5. **Style**: Photorealism with sharp lines, realistic colors, and high detail.
 6. **Composition**: Central object (e.g., person, caravan, symbol) in focus, dynamic or static movement, background (e.g., desert, mountains) reinforcing the theme.
-7. Aspect ratio 1:1, 8K resolution."""
\ No newline at end of file
+7. Aspect ratio 1:1, 8K resolution."""
+
+BATCH_PROMPT = """Create {post_count} complete Telegram posts about the theme '{theme}' in {style} style, written in the language with code '{language}'. Each post covers a different key event, aspect, or example of the theme, distributed evenly without repetition.
+
+For every post provide:
+- "title": a short, unique, engaging title without quotation marks or numbering;
+- "content": the post body in 2 paragraphs of lively, emotional language with specific examples, strictly up to {max_length} characters, without repeating the title;
+- "hashtags": 3 relevant hashtags separated by spaces, e.g. "#history #events #facts";
+- "image_prompt": a concise English prompt (up to 300 characters) for a photorealistic Flux image reflecting the post: key scene, setting, lighting, composition.
+
+Return ONLY a JSON array of exactly {post_count} objects with the keys "title", "content", "hashtags", "image_prompt", with no text before or after it."""
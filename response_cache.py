@@ -0,0 +1,66 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from config import LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MEMORY_SIZE
+from database_manager import get_cached_response, save_cached_response, evict_cached_responses
+from ttl_cache import TTLCache, MISSING
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class ResponseCache:
+    """
+    Кэш ответов языковых моделей с адресацией по содержимому запроса.
+
+    Ключ — хэш модели, промпта и параметров генерации. Свежие ответы
+    держатся в памяти, все ответы — в таблице llm_cache, поэтому кэш
+    переживает перезапуски. Записи живут ttl секунд, размер таблицы
+    ограничен max_entries с вытеснением давно неиспользуемых.
+    """
+    EVICT_EVERY = 50  # Как часто (в записях) чистить таблицу
+
+    def __init__(self, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES, memory_size=LLM_CACHE_MEMORY_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = TTLCache(memory_size, ttl)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(**parts):
+        """Строит ключ кэша из модели, промпта и параметров запроса."""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key):
+        """Возвращает сохраненный ответ или None."""
+        response = self._memory.get(key)
+        if response is MISSING:
+            try:
+                entry = await get_cached_response(key, self.ttl)
+            except Exception as e:
+                logging.error(f"Ошибка чтения кэша ответов: {e}")
+                entry = None
+            response = None
+            if entry is not None:
+                response, created_at = entry
+                # В памяти запись живет до того же срока, что и в базе, а не ttl заново
+                age = (datetime.now(timezone.utc) - created_at).total_seconds()
+                self._memory.set(key, response, ttl=max(self.ttl - age, 1))
+        if response is None or response is MISSING:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response
+
+    async def set(self, key, response):
+        """Сохраняет ответ в памяти и в базе."""
+        self._memory.set(key, response)
+        try:
+            await save_cached_response(key, response)
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                await evict_cached_responses(self.max_entries, self.ttl)
+        except Exception as e:
+            logging.error(f"Ошибка записи в кэш ответов: {e}")
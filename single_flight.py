@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов.
+
+    Пока запрос с данным ключом выполняется, повторные вызовы с тем же ключом
+    не отправляют новый запрос, а ждут результата уже запущенного. Отмена
+    одного из ожидающих не прерывает общий запрос; он отменяется, только
+    когда его перестали ждать все.
+    """
+    def __init__(self, name="single-flight"):
+        self.name = name
+        self._calls = {}    # key -> asyncio.Task
+        self._waiters = {}  # key -> число ожидающих вызовов
+        self.shared = 0     # Сколько вызовов получили чужой результат
+
+    async def do(self, key, func):
+        """
+        Выполняет func() или присоединяется к уже выполняющемуся вызову с тем же ключом.
+
+        Параметры:
+            key (hashable): Ключ запроса
+            func (callable): Функция без аргументов, возвращающая корутину
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            self.shared += 1
+            logging.info(f"{self.name}: запрос присоединен к уже выполняющемуся")
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1:
+                task.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+
+    @property
+    def in_flight(self):
+        """Количество выполняющихся сейчас запросов."""
+        return len(self._calls)
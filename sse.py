@@ -0,0 +1,39 @@
+import json
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class StreamInterrupted(Exception):
+    """Поток оборвался после начала вывода: полученный текст неполный."""
+
+async def iter_sse_json(response):
+    """
+    Читает ответ в формате Server-Sent Events и отдает данные событий,
+    разобранные как JSON. Завершается на маркере [DONE] или при закрытии потока.
+    """
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").strip()
+        # Пустые строки разделяют события, строки с ':' — комментарии (keep-alive)
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            logging.warning(f"Не удалось разобрать событие потока: {data[:200]}")
+
+def chunk_text(event):
+    """Извлекает фрагмент текста из события потока в формате chat/completions."""
+    choices = event.get("choices") or []
+    if not choices:
+        return ""
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+def finish_reason(event):
+    """Причина завершения генерации из события потока или None, если генерация продолжается."""
+    choices = event.get("choices") or []
+    if not choices:
+        return None
+    return choices[0].get("finish_reason")
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from config import STATE_CACHE_SIZE, STATE_FLUSH_INTERVAL, STATE_TTL_DAYS, STATE_COMPACT_INTERVAL
+from database_manager import load_chat_state, save_chat_states, touch_chat_states, delete_stale_chat_states, checkpoint_database
+from ttl_cache import TTLCache, MISSING
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class ChatStateStore:
+    """
+    Хранилище состояния диалога с пользователями.
+
+    Состояние каждого чата — небольшой словарь (язык, стиль, флаги ожидания),
+    который хранится в таблице chat_state. В памяти держатся только недавно
+    активные чаты (LRU-кэш), состояние подгружается при первом обновлении
+    от чата, а изменения пишутся в базу пакетами в фоне.
+    """
+    def __init__(self, cache_size=STATE_CACHE_SIZE, flush_interval=STATE_FLUSH_INTERVAL):
+        self._cache = TTLCache(cache_size)
+        self._dirty = {}  # chat_id -> состояние, еще не записанное в базу
+        self._active = set()  # Чаты, присылавшие обновления с последней записи
+        self.flush_interval = flush_interval
+
+    def field(self, name):
+        """Возвращает словарь-представление одного поля состояния всех чатов."""
+        return StateField(self, name)
+
+    async def load(self, chat_id):
+        """Подгружает состояние чата из базы, если его нет в памяти, и отмечает активность чата."""
+        self._active.add(chat_id)
+        if chat_id in self._dirty or chat_id in self._cache:
+            return
+        state = await load_chat_state(chat_id)
+        # Пока шел запрос, состояние могло измениться в памяти
+        if chat_id not in self._dirty and chat_id not in self._cache:
+            self._cache.set(chat_id, state or {})
+
+    def _state(self, chat_id):
+        state = self._dirty.get(chat_id)
+        if state is None:
+            state = self._cache.get(chat_id)
+            if state is MISSING:
+                # Чат не был подгружен через load(): начинаем с пустого состояния
+                state = {}
+                self._cache.set(chat_id, state)
+        return state
+
+    def _mark_dirty(self, chat_id, state):
+        # Измененное состояние удерживается до записи, даже если его вытеснит кэш
+        self._dirty[chat_id] = state
+        self._cache.set(chat_id, state)
+
+    @property
+    def pending_writes(self):
+        """Количество чатов с изменениями, еще не записанными в базу."""
+        return len(self._dirty)
+
+    async def flush(self):
+        """
+        Записывает измененные состояния в базу и продлевает срок хранения
+        состояний активных чатов, даже если они не менялись.
+        """
+        pending = dict(self._dirty)
+        self._dirty.clear()
+        active = self._active - pending.keys()
+        self._active = set()
+        try:
+            if pending:
+                await save_chat_states({chat_id: dict(state) for chat_id, state in pending.items()})
+            if active:
+                await touch_chat_states(active)
+        except Exception:
+            for chat_id, state in pending.items():
+                self._dirty.setdefault(chat_id, state)
+            self._active |= active
+            raise
+
+    async def compact(self):
+        """Удаляет устаревшие состояния и сжимает журнал базы."""
+        removed = await delete_stale_chat_states(STATE_TTL_DAYS)
+        await checkpoint_database()
+        logging.info(f"Очистка состояний чатов: удалено {removed} устаревших записей")
+
+    async def run_maintenance(self):
+        """Фоновая задача: периодическая запись изменений и очистка устаревших состояний."""
+        loop = asyncio.get_running_loop()
+        next_compact = loop.time() + STATE_COMPACT_INTERVAL
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+                if loop.time() >= next_compact:
+                    await self.compact()
+                    next_compact = loop.time() + STATE_COMPACT_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка сохранения состояний чатов: {e}")
+
+class StateField:
+    """Поле состояния чатов с интерфейсом словаря chat_id -> значение."""
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def get(self, chat_id, default=None):
+        return self.store._state(chat_id).get(self.name, default)
+
+    def pop(self, chat_id, default=None):
+        state = self.store._state(chat_id)
+        if self.name not in state:
+            return default
+        value = state.pop(self.name)
+        self.store._mark_dirty(chat_id, state)
+        return value
+
+    def __contains__(self, chat_id):
+        return self.name in self.store._state(chat_id)
+
+    def __getitem__(self, chat_id):
+        return self.store._state(chat_id)[self.name]
+
+    def __setitem__(self, chat_id, value):
+        state = self.store._state(chat_id)
+        state[self.name] = value
+        self.store._mark_dirty(chat_id, state)
+
+    def __delitem__(self, chat_id):
+        state = self.store._state(chat_id)
+        del state[self.name]
+        self.store._mark_dirty(chat_id, state)
@@ -2,15 +2,20 @@ import aiohttp
 import re
 import json
 import logging
-import asyncio
 import io
-from config import TELEGRAM_BOT_TOKEN, TEST_CHANNEL_ID, MAX_CAPTION_LENGTH, IMGUR_CLIENT_ID
+from config import TELEGRAM_BOT_TOKEN, TEST_CHANNEL_ID, MAX_CAPTION_LENGTH
+from telegram_client import get_telegram_client
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
 class TelegramBot:
-    """Класс для отправки сообщений в Telegram."""
+    """
+    Класс для отправки сообщений в Telegram.
+
+    Запросы к Telegram идут через общий TelegramClient с пулом соединений;
+    собственная сессия класса нужна только для запросов к другим API.
+    """
     def __init__(self, token, chat_id):
         self.token = token
         self.chat_id = chat_id
@@ -27,14 +32,10 @@ class TelegramBot:
         if self.session and not self.session.closed:
             await self.session.close()
     
-    async def send_telegram_post(self, text, image=None, session=None):
+    async def send_telegram_post(self, text, image=None):
         """Отправляет пост с изображением в Telegram."""
         logging.info(f"Отправка поста: длина текста={len(text)}, есть изображение={image is not None}")
         
-        use_existing_session = session is not None
-        if not use_existing_session:
-            session = await self.create_session()
-        
         try:
             # Проверяем, что текст содержит заголовок и основной текст
             parts = text.split("\n\n", 1)
@@ -43,14 +44,9 @@ class TelegramBot:
                 title, content = text.split("\n", 1) if "\n" in text else (text, "")
                 text = f"{title}\n\n{content}"
             
-            # Если есть изображение, загружаем его на Imgur
-            image_url = None
-            if image:
-                image_url = await upload_to_imgur(image, session)
-            
-            # Отправляем пост в Telegram
+            # Отправляем пост в Telegram; изображение загружается напрямую или уходит по file_id
             message_id, file_id = await send_telegram_post(
-                self.chat_id, text, image_url, image, session, token=self.token
+                self.chat_id, text, image_data=image, token=self.token
             )
             
             return message_id is not None
@@ -58,81 +54,40 @@ class TelegramBot:
         except Exception as e:
             logging.error(f"Ошибка отправки поста: {e}")
             return False
-        finally:
-            if not use_existing_session and session:
-                await session.close()
     
-    async def send_message(self, text, reply_markup=None, session=None):
+    async def send_message(self, text, reply_markup=None):
         """Отправляет текстовое сообщение в Telegram."""
-        use_existing_session = session is not None
-        if not use_existing_session:
-            session = await self.create_session()
-        
         try:
-            message_id = await send_telegram_message(
-                self.chat_id, text, reply_markup, session, token=self.token
-            )
-            return message_id
+            return await send_telegram_message(self.chat_id, text, reply_markup, token=self.token)
         except Exception as e:
             logging.error(f"Ошибка отправки сообщения: {e}")
             return None
-        finally:
-            if not use_existing_session and session:
-                await session.close()
     
-    async def edit_message(self, message_id, text, reply_markup=None, session=None):
+    async def edit_message(self, message_id, text, reply_markup=None):
         """Редактирует существующее сообщение в Telegram."""
-        use_existing_session = session is not None
-        if not use_existing_session:
-            session = await self.create_session()
-        
         try:
-            result = await edit_telegram_message(
-                self.chat_id, message_id, text, reply_markup, session, token=self.token
-            )
+            result = await edit_telegram_message(self.chat_id, message_id, text, reply_markup, token=self.token)
             return result is not None
         except Exception as e:
             logging.error(f"Ошибка редактирования сообщения: {e}")
             return False
-        finally:
-            if not use_existing_session and session:
-                await session.close()
     
-    async def delete_messages(self, message_ids, session=None):
+    async def delete_messages(self, message_ids):
         """Удаляет сообщения из чата."""
-        use_existing_session = session is not None
-        if not use_existing_session:
-            session = await self.create_session()
-        
         try:
-            result = await delete_telegram_messages(
-                self.chat_id, message_ids, session, token=self.token
-            )
-            return result
+            return await delete_telegram_messages(self.chat_id, message_ids, token=self.token)
         except Exception as e:
             logging.error(f"Ошибка удаления сообщений: {e}")
             return False
-        finally:
-            if not use_existing_session and session:
-                await session.close()
     
-    async def forward_post(self, from_chat_id, message_id, session=None):
+    async def forward_post(self, from_chat_id, message_id):
         """Пересылает сообщение из одного чата в этот чат."""
-        use_existing_session = session is not None
-        if not use_existing_session:
-            session = await self.create_session()
-        
         try:
-            result = await forward_telegram_post(
-                from_chat_id, message_id, self.chat_id, session, token=self.token
-            )
+            result = await forward_telegram_post(from_chat_id, message_id, self.chat_id, token=self.token)
             return result is not None
         except Exception as e:
             logging.error(f"Ошибка пересылки сообщения: {e}")
             return False
-        finally:
-            if not use_existing_session and session:
-                await session.close()
 
 def escape_markdown(text):
     """Экранирует специальные символы для MarkdownV2, корректно обрабатывая точки и восклицательные знаки."""
@@ -152,45 +107,48 @@ def truncate_post(text, max_length=MAX_CAPTION_LENGTH):
     return (truncated[:last_punctuation + 1] + "...") if last_punctuation > -1 else (truncated + "...")
 
 
-async def upload_to_imgur(image_data, session=None):
-    """Загружает изображение на Imgur и возвращает URL."""
-    url = "https://api.imgur.com/3/image"
-    headers = {"Authorization": f"Client-ID {IMGUR_CLIENT_ID}"}
-    image_bytes = image_data.getvalue() if isinstance(image_data, io.BytesIO) else image_data
-
-    for attempt in range(5):
-        try:
-            form_data = aiohttp.FormData()
-            form_data.add_field("image", io.BytesIO(image_bytes), filename="image.jpg", content_type="image/jpeg")
-
-            async with session.post(url, headers=headers, data=form_data, timeout=aiohttp.ClientTimeout(total=60)) as response:
-                if response.status == 503:
-                    logging.warning(f"Imgur временно недоступен (503), повторяем через {10 * (attempt + 1)} секунд...")
-                    await asyncio.sleep(10 * (attempt + 1))
-                    continue
-                if response.status != 200:
-                    logging.error(f"Ошибка Imgur: {response.status}, сообщение='{await response.text()}'")
-                    raise Exception(f"Загрузка на Imgur не удалась")
-
-                result = await response.json()
-                logging.info(f"Изображение загружено на Imgur: {result['data']['link']}")
-                return result["data"]["link"]
+def open_image(image_data):
+    """
+    Возвращает новый файловый объект для отправки изображения.
+    Изображение из файла (CachedImage) открывается заново, байты оборачиваются
+    в BytesIO с общим буфером, без копирования.
+    """
+    if hasattr(image_data, "open"):
+        return image_data.open()
+    if isinstance(image_data, io.BytesIO):
+        return io.BytesIO(image_data.getvalue())
+    return io.BytesIO(image_data)
 
-        except Exception as e:
-            logging.error(f"Ошибка загрузки на Imgur (попытка {attempt + 1}): {e}")
-            if attempt < 4:
-                await asyncio.sleep(10 * (attempt + 1))
+def photo_sources(image_data=None, image_url=None, file_id=None):
+    """
+    Выбирает способы доставки изображения в Telegram в порядке предпочтения.
 
-    logging.error("Не удалось загрузить изображение на Imgur после всех попыток")
-    return None
+    Возвращает список пар (способ, источник):
+        "file_id" — изображение уже на серверах Telegram, отправляется по идентификатору без загрузки;
+        "upload" — прямая загрузка файла через multipart/form-data;
+        "url" — Telegram сам скачивает изображение по ссылке.
+    Следующий способ используется, только если предыдущий не сработал.
+    """
+    sources = []
+    file_id = file_id or getattr(image_data, "file_id", None)
+    if file_id:
+        sources.append(("file_id", file_id))
+    if image_data:
+        sources.append(("upload", image_data))
+    image_url = image_url or getattr(image_data, "url", None)
+    if image_url:
+        sources.append(("url", image_url))
+    return sources
 
-async def send_telegram_post(chat_id, formatted_post, image_url=None, image_data=None, session=None, token=None):
+async def send_telegram_post(chat_id, formatted_post, image_url=None, image_data=None, token=None, file_id=None):
     """
     Отправляет пост в Telegram.
     Форматирует заголовок *перед* отправкой.
+    Способ доставки изображения выбирается по тому, что о нем известно
+    (см. photo_sources): file_id, файл для загрузки или ссылка.
+    Возвращает (message_id, file_id) или (None, None).
     """
-    token = token or TELEGRAM_BOT_TOKEN
-    logging.info(f"Отправка поста в Telegram: chat_id={chat_id}, есть изображение={image_data is not None}")
+    logging.info(f"Отправка поста в Telegram: chat_id={chat_id}, есть изображение={bool(image_data or image_url or file_id)}")
     
     # Разделяем пост на части *перед* форматированием
     parts = formatted_post.split("\n\n", 2)
@@ -208,124 +166,127 @@ async def send_telegram_post(chat_id, formatted_post, image_url=None, image_data
     final_post = f"{formatted_title}\n\n{formatted_content}\n\n{formatted_hashtags}"
     final_post = truncate_post(final_post)  # Обрезаем *после* форматирования
 
-    if image_data:  # Если у нас есть бинарные данные изображения
-        logging.info(f"Отправка изображения напрямую через multipart/form-data")
-        url = f"https://api.telegram.org/bot{token}/sendPhoto"
-        
-        # Создаем форму с multipart/form-data
+    sources = photo_sources(image_data, image_url, file_id)
+    for kind, source in sources:
+        if kind == "upload":
+            message_id, sent_file_id = await send_photo_upload(chat_id, source, final_post, token=token)
+        else:
+            message_id, sent_file_id = await send_photo_by_reference(chat_id, source, final_post, token=token)
+        if message_id:
+            return message_id, sent_file_id
+        logging.warning(f"Не удалось отправить изображение способом '{kind}'")
+
+    if sources:
+        # Если не удалось отправить с изображением, отправляем пост без него
+        logging.info("Попытка отправить пост без изображения")
+
+    payload = {
+        "chat_id": chat_id,
+        "text": final_post,
+        "parse_mode": "MarkdownV2"
+    }
+    data = await get_telegram_client(token).call("sendMessage", payload, chat_id=chat_id, attempts=5)
+    if not data or not data.get("ok"):
+        log_telegram_error("Не удалось отправить пост", data)
+        return None, None
+    message_id = data["result"]["message_id"]
+    logging.info(f"Пост отправлен в Telegram: message_id={message_id}")
+    return message_id, None
+
+def log_telegram_error(message, data):
+    """Пишет в лог ошибку Telegram с пояснением частых причин."""
+    description = (data or {}).get("description", "нет ответа")
+    logging.error(f"{message}: {description}")
+    if "can't parse entities" in description:
+        logging.error("  -> Ошибка форматирования Markdown. Проверьте escape_markdown().")
+
+def sent_photo_file_id(data):
+    """Возвращает file_id самого большого размера фото из ответа sendPhoto."""
+    photos = data["result"].get("photo") or [{}]
+    return photos[-1].get("file_id")
+
+async def send_photo_upload(chat_id, image_data, caption, token=None):
+    """
+    Загружает изображение в Telegram через multipart/form-data.
+    caption должен быть подготовлен для MarkdownV2. Возвращает (message_id, file_id) или (None, None).
+    """
+    logging.info(f"Отправка изображения напрямую через multipart/form-data")
+
+    def form():
+        # Форма собирается заново на каждую попытку: aiohttp не отправляет FormData
+        # повторно и закрывает файл после запроса. Изображение читается из файла частями
         form_data = aiohttp.FormData()
         form_data.add_field("chat_id", str(chat_id))
-        form_data.add_field("caption", final_post)
+        form_data.add_field("caption", caption)
         form_data.add_field("parse_mode", "MarkdownV2")
-        
-        # Добавляем изображение
-        if hasattr(image_data, 'read'):  # Это файл-подобный объект (BytesIO)
-            # Устанавливаем указатель в начало файла
-            image_data.seek(0)
-            form_data.add_field("photo", image_data, filename="image.jpg", content_type="image/jpeg")
-        else:  # Это уже бинарные данные
-            form_data.add_field("photo", io.BytesIO(image_data), filename="image.jpg", content_type="image/jpeg")
-        
-        payload = form_data
-    elif image_url:  # Если у нас есть URL изображения
-        url = f"https://api.telegram.org/bot{token}/sendPhoto"
-        payload = {
-            "chat_id": chat_id,
-            "photo": image_url,
-            "caption": final_post,
-            "parse_mode": "MarkdownV2"
-        }
-    else:  # Если нет изображения
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        payload = {
-            "chat_id": chat_id,
-            "text": final_post,
-            "parse_mode": "MarkdownV2"
-        }
+        form_data.add_field("photo", open_image(image_data), filename="image.jpg", content_type="image/jpeg")
+        return form_data
 
-    for attempt in range(5):
-        try:
-            if isinstance(payload, aiohttp.FormData):
-                async with session.post(url, data=payload, timeout=aiohttp.ClientTimeout(total=60)) as response:
-                    response_text = await response.text()
-                    if response.status != 200:
-                        logging.error(f"Ошибка Telegram при отправке изображения (попытка {attempt + 1}): {response.status}, сообщение='{response_text}'")
-                        if attempt < 4:
-                            await asyncio.sleep(5 * (attempt + 1))
-                        continue
-                    
-                    result = await response.json()
-                    message_id = result["result"]["message_id"]
-                    file_id = result["result"].get("photo", [{}])[-1].get("file_id") if "photo" in result["result"] else None
-                    logging.info(f"Пост с изображением отправлен в Telegram: message_id={message_id}, file_id={file_id}")
-                    return message_id, file_id
-            else:
-                async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    response_text = await response.text()
-                    if response.status != 200:
-                        logging.error(f"Ошибка Telegram (попытка {attempt + 1}): {response.status}, сообщение='{response_text}'")
-                        if response.status == 400 and "can't parse entities" in response_text:
-                            logging.error("  -> Ошибка форматирования Markdown. Проверьте escape_markdown().")
-                        elif response.status == 429:
-                            logging.warning("  -> Слишком много запросов к Telegram. Попробуйте увеличить задержки.")
-                        if attempt < 4:
-                            await asyncio.sleep(5 * (attempt + 1))
-                        continue
-                    
-                    result = await response.json()
-                    message_id = result["result"]["message_id"]
-                    file_id = result["result"].get("photo", [{}])[-1].get("file_id") if "photo" in result["result"] else None
-                    logging.info(f"Пост отправлен в Telegram: message_id={message_id}, file_id={file_id}")
-                    return message_id, file_id
-        except Exception as e:
-            logging.error(f"Ошибка отправки поста в Telegram (попытка {attempt + 1}): {e}")
-            if attempt < 4:
-                await asyncio.sleep(5 * (attempt + 1))
+    data = await get_telegram_client(token).call("sendPhoto", form=form, chat_id=chat_id, attempts=5, timeout=60)
+    if not data or not data.get("ok"):
+        log_telegram_error("Ошибка Telegram при отправке изображения", data)
+        return None, None
+    message_id = data["result"]["message_id"]
+    file_id = sent_photo_file_id(data)
+    logging.info(f"Пост с изображением отправлен в Telegram: message_id={message_id}, file_id={file_id}")
+    return message_id, file_id
 
-    logging.error("Не удалось отправить пост после всех попыток")
-    # Если не удалось отправить с изображением, попробуем без него
-    if image_data or image_url:
-        logging.info("Попытка отправить пост без изображения")
-        return await send_telegram_post(chat_id, formatted_post, None, None, session)
-    return None, None
+async def republish_post(chat_ids, formatted_post, file_id=None, image_data=None, token=None):
+    """
+    Публикует один и тот же пост в несколько чатов.
 
+    Изображение загружается в Telegram не больше одного раза: если file_id
+    неизвестен, первая успешная отправка загружает image_data, а остальные
+    чаты получают изображение по полученному file_id.
+    Возвращает (список message_id в порядке chat_ids, file_id).
+    """
+    message_ids = []
+    for chat_id in chat_ids:
+        message_id, sent_file_id = await send_telegram_post(chat_id, formatted_post, image_data=image_data, token=token, file_id=file_id)
+        if sent_file_id:
+            file_id = sent_file_id
+        message_ids.append(message_id)
+    return message_ids, file_id
 
-async def send_telegram_message(chat_id, text, reply_markup=None, session=None, token=None):
+async def send_photo_by_reference(chat_id, photo, caption, token=None):
+    """
+    Отправляет фото без загрузки байтов: по file_id изображения, уже загруженного
+    в Telegram, или по URL, который Telegram скачает сам.
+    caption должен быть подготовлен для MarkdownV2. Возвращает (message_id, file_id) или (None, None).
+    """
+    payload = {
+        "chat_id": chat_id,
+        "photo": photo,
+        "caption": caption,
+        "parse_mode": "MarkdownV2"
+    }
+    # file_id мог устареть, а ссылка — перестать открываться: такие ошибки не повторяются,
+    # send_telegram_post попробует следующий способ доставки
+    data = await get_telegram_client(token).call("sendPhoto", payload, chat_id=chat_id)
+    if not data or not data.get("ok"):
+        log_telegram_error("Ошибка отправки фото по ссылке или file_id", data)
+        return None, None
+    message_id = data["result"]["message_id"]
+    file_id = sent_photo_file_id(data)
+    logging.info(f"Пост с изображением отправлен без загрузки: message_id={message_id}, file_id={file_id}")
+    return message_id, file_id
+
+async def send_telegram_message(chat_id, text, reply_markup=None, token=None):
     """Отправляет текстовое сообщение в Telegram."""
-    token = token or TELEGRAM_BOT_TOKEN
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {"chat_id": chat_id, "text": escape_markdown(text), "parse_mode": "MarkdownV2"}  # Экранируем текст *перед* отправкой
     if reply_markup:
         payload["reply_markup"] = json.dumps(reply_markup)  # Добавляем клавиатуру, если есть
 
-    for attempt in range(3):
-        try:
-            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                response_text = await response.text()
-                if response.status != 200:
-                    logging.error(f"Ошибка отправки сообщения в Telegram (попытка {attempt + 1}): {response.status}, message='{response_text}', url='{url}'")
-                    if response.status == 400 and "can't parse entities" in response_text:
-                        logging.error("  -> Probable Markdown formatting error. Check escape_markdown().")
-                    if attempt < 2:
-                        await asyncio.sleep(5 * (attempt+1))
-                    continue
-
-                result = await response.json()
-                message_id = result["result"]["message_id"]
-                logging.info(f"Сообщение отправлено: chat_id={chat_id}, message_id={message_id}")
-                return message_id
-        except Exception as e:
-            logging.error(f"Ошибка отправки сообщения в Telegram (попытка {attempt + 1}): {e}")
-            if attempt < 2:
-                await asyncio.sleep(5 * (attempt + 1))
-
-    logging.error("Не удалось отправить сообщение после всех попыток")
-    return None
+    data = await get_telegram_client(token).call("sendMessage", payload, chat_id=chat_id)
+    if not data or not data.get("ok"):
+        log_telegram_error("Не удалось отправить сообщение", data)
+        return None
+    message_id = data["result"]["message_id"]
+    logging.info(f"Сообщение отправлено: chat_id={chat_id}, message_id={message_id}")
+    return message_id
 
-async def edit_telegram_message(chat_id, message_id, text, reply_markup=None, session=None, token=None):
+async def edit_telegram_message(chat_id, message_id, text, reply_markup=None, token=None):
     """Редактирует существующее сообщение в Telegram."""
-    token = token or TELEGRAM_BOT_TOKEN
-    url = f"https://api.telegram.org/bot{token}/editMessageText"
     payload = {
         "chat_id": chat_id,
         "message_id": message_id,
@@ -335,88 +296,44 @@ async def edit_telegram_message(chat_id, message_id, text, reply_markup=None, se
     if reply_markup:
         payload["reply_markup"] = json.dumps(reply_markup)
 
-    for attempt in range(3):
-        try:
-            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                if response.status != 200:
-                    response_text = await response.text()
-                    logging.error(f"Ошибка редактирования сообщения (попытка {attempt + 1}): {response.status}, message='{response_text}'")
-                    if "message is not modified" in response_text:
-                        logging.warning("Сообщение не было изменено, так как текст идентичен")
-                        return message_id  # Считаем успехом, если сообщение уже содержит этот текст
-                    if attempt < 2:
-                        await asyncio.sleep(5 * (attempt+1))
-                    continue
-
-                result = await response.json()
-                logging.info(f"Сообщение отредактировано: chat_id={chat_id}, message_id={message_id}")
-                return message_id
-        except Exception as e:
-            logging.error(f"Ошибка редактирования сообщения (попытка {attempt + 1}): {e}")
-            if attempt < 2:
-                await asyncio.sleep(5 * (attempt + 1))
-
-    logging.error("Не удалось отредактировать сообщение после всех попыток")
-    return None
+    data = await get_telegram_client(token).call("editMessageText", payload, chat_id=chat_id)
+    if data and not data.get("ok") and "message is not modified" in data.get("description", ""):
+        logging.warning("Сообщение не было изменено, так как текст идентичен")
+        return message_id  # Считаем успехом, если сообщение уже содержит этот текст
+    if not data or not data.get("ok"):
+        log_telegram_error("Не удалось отредактировать сообщение", data)
+        return None
+    logging.info(f"Сообщение отредактировано: chat_id={chat_id}, message_id={message_id}")
+    return message_id
 
-async def delete_telegram_messages(chat_id, message_ids, session=None, token=None):
+async def delete_telegram_messages(chat_id, message_ids, token=None):
     """Удаляет сообщения из чата."""
-    token = token or TELEGRAM_BOT_TOKEN
     if not isinstance(message_ids, list):
         message_ids = [message_ids]
     
-    url = f"https://api.telegram.org/bot{token}/deleteMessage"
+    client = get_telegram_client(token)
     results = []
-    
     for message_id in message_ids:
-        payload = {"chat_id": chat_id, "message_id": message_id}
-        
-        for attempt in range(3):
-            try:
-                async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    if response.status != 200:
-                        logging.error(f"Ошибка удаления сообщения {message_id} (попытка {attempt + 1}): {response.status}")
-                        if attempt < 2:
-                            await asyncio.sleep(2 * (attempt+1))
-                        continue
-                    
-                    results.append(message_id)
-                    logging.info(f"Сообщение {message_id} удалено из чата {chat_id}")
-                    break
-            except Exception as e:
-                logging.error(f"Ошибка удаления сообщения {message_id} (попытка {attempt + 1}): {e}")
-                if attempt < 2:
-                    await asyncio.sleep(2 * (attempt + 1))
+        data = await client.call("deleteMessage", {"chat_id": chat_id, "message_id": message_id}, chat_id=chat_id)
+        if data and data.get("ok"):
+            results.append(message_id)
+            logging.info(f"Сообщение {message_id} удалено из чата {chat_id}")
+        else:
+            log_telegram_error(f"Ошибка удаления сообщения {message_id}", data)
     
     return len(results) == len(message_ids)  # True если все сообщения удалены
 
-async def forward_telegram_post(from_chat_id, message_id, to_chat_id, session=None, token=None):
+async def forward_telegram_post(from_chat_id, message_id, to_chat_id, token=None):
     """Пересылает сообщение из одного чата в другой."""
-    token = token or TELEGRAM_BOT_TOKEN
-    url = f"https://api.telegram.org/bot{token}/forwardMessage"
     payload = {
         "chat_id": to_chat_id,
         "from_chat_id": from_chat_id,
         "message_id": message_id
     }
-    
-    for attempt in range(3):
-        try:
-            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                if response.status != 200:
-                    logging.error(f"Ошибка пересылки сообщения (попытка {attempt + 1}): {response.status}")
-                    if attempt < 2:
-                        await asyncio.sleep(5 * (attempt+1))
-                    continue
-                
-                result = await response.json()
-                new_message_id = result["result"]["message_id"]
-                logging.info(f"Сообщение {message_id} переслано из {from_chat_id} в {to_chat_id}, новый ID: {new_message_id}")
-                return new_message_id
-        except Exception as e:
-            logging.error(f"Ошибка пересылки сообщения (попытка {attempt + 1}): {e}")
-            if attempt < 2:
-                await asyncio.sleep(5 * (attempt + 1))
-    
-    logging.error("Не удалось переслать сообщение после всех попыток")
-    return None# Telegram Bot module
+    data = await get_telegram_client(token).call("forwardMessage", payload, chat_id=to_chat_id)
+    if not data or not data.get("ok"):
+        log_telegram_error("Не удалось переслать сообщение", data)
+        return None
+    new_message_id = data["result"]["message_id"]
+    logging.info(f"Сообщение {message_id} переслано из {from_chat_id} в {to_chat_id}, новый ID: {new_message_id}")
+    return new_message_id
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+import aiohttp
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_GROUP_RATE_PER_MIN,
+    TELEGRAM_CHAT_BURST, TELEGRAM_POOL_SIZE
+)
+from metrics import provider_latency
+from ttl_cache import TTLCache, MISSING
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+class TokenBucket:
+    """
+    Ведро токенов: не больше rate операций в секунду с запасом capacity.
+
+    Токены можно брать в долг: reserve() сразу забирает токен и возвращает,
+    сколько ждать до его появления, поэтому ожидающие обслуживаются
+    в порядке обращения без блокировок.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Забирает токен и возвращает время ожидания в секундах."""
+        self._refill()
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds):
+        """Запрещает операции на ближайшие seconds секунд."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class RateLimiter:
+    """
+    Планировщик запросов по лимитам Telegram.
+
+    Общее ведро ограничивает бота в целом (около 30 сообщений в секунду),
+    ведро каждого чата — отправку в один чат: около одного сообщения
+    в секунду в личный чат и 20 в минуту в группу или канал.
+    """
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE,
+                 group_rate_per_min=TELEGRAM_GROUP_RATE_PER_MIN, chat_burst=TELEGRAM_CHAT_BURST, max_chats=10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_min / 60
+        self.chat_burst = chat_burst
+        self._chats = TTLCache(max_chats)  # chat_id -> TokenBucket; давно неактивные чаты вытесняются
+
+    @staticmethod
+    def is_private(chat_id):
+        """Личные чаты имеют положительный id, группы и каналы — отрицательный или @имя."""
+        try:
+            return int(chat_id) > 0
+        except (TypeError, ValueError):
+            return False
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is MISSING:
+            rate = self.chat_rate if self.is_private(chat_id) else self.group_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def acquire(self, chat_id=None):
+        """Ждет, пока отправка в чат chat_id (None — без привязки к чату) не нарушит лимиты."""
+        if chat_id is not None:
+            delay = self._bucket(chat_id).reserve()
+            if delay:
+                await asyncio.sleep(delay)
+        delay = self.global_bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def pause(self, chat_id, seconds):
+        """Приостанавливает отправку после ответа 429: в чат chat_id или, без него, всю."""
+        bucket = self._bucket(chat_id) if chat_id is not None else self.global_bucket
+        bucket.pause(seconds)
+
+class TelegramClient:
+    """
+    Клиент Telegram Bot API.
+
+    Все запросы идут через одну сессию aiohttp с пулом keep-alive соединений
+    и проходят через планировщик RateLimiter. Ответ 429 приостанавливает
+    отправку на указанное Telegram время retry_after, сетевые ошибки и ответы
+    5xx повторяются с экспоненциальной задержкой, а прочие ошибки 4xx
+    возвращаются вызывающему коду без повторов.
+    """
+    def __init__(self, token=TELEGRAM_BOT_TOKEN, limiter=None, pool_size=TELEGRAM_POOL_SIZE):
+        self.base_url = f"https://api.telegram.org/bot{token}"
+        self.limiter = limiter or RateLimiter()
+        self.pool_size = pool_size
+        self._session = None
+
+    async def session(self):
+        """Возвращает общую сессию, создавая ее при первом обращении."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def call(self, method, payload=None, form=None, chat_id=None, limited=True, attempts=3, timeout=30):
+        """
+        Вызывает метод Bot API.
+
+        Параметры:
+            method (str): Имя метода, например "sendMessage"
+            payload (dict, optional): JSON-параметры запроса
+            form (callable, optional): Функция, собирающая aiohttp.FormData для загрузки файлов;
+                вызывается заново на каждую попытку
+            chat_id (optional): Чат, в который идет отправка; учитывается в лимитах этого чата
+            limited (bool): Применять ли общий лимит (False для getUpdates и служебных запросов)
+            attempts (int): Число попыток при сетевых ошибках и ответах 5xx
+            timeout (float): Таймаут запроса, секунды
+
+        Возвращает ответ Telegram (словарь с ok, result или description) или None,
+        если ответа получить не удалось.
+        """
+        url = f"{self.base_url}/{method}"
+        data = None
+        for attempt in range(attempts):
+            if limited:
+                await self.limiter.acquire(chat_id)
+            started = time.monotonic()
+            try:
+                session = await self.session()
+                body = {"data": form()} if form is not None else {"json": payload}
+                async with session.post(url, timeout=aiohttp.ClientTimeout(total=timeout), **body) as response:
+                    status = response.status
+                    data = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logging.error(f"Ошибка запроса {method} к Telegram (попытка {attempt + 1}): {e}")
+                data = None
+                if attempt < attempts - 1:
+                    await asyncio.sleep(min(2 ** attempt, 10))
+                continue
+            finally:
+                if method != "getUpdates":  # Долгий опрос висит до ответа Telegram и исказил бы задержки
+                    provider_latency.observe(time.monotonic() - started, "telegram")
+
+            if data.get("ok"):
+                return data
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if status == 429 and retry_after:
+                logging.warning(f"Telegram ограничил частоту запросов {method} (chat_id={chat_id}), пауза {retry_after} с")
+                self.limiter.pause(chat_id, retry_after)
+                if not limited:
+                    await asyncio.sleep(retry_after)
+                continue
+            if status >= 500:
+                logging.error(f"Ошибка Telegram {status} в {method} (попытка {attempt + 1}): {data.get('description')}")
+                if attempt < attempts - 1:
+                    await asyncio.sleep(min(2 ** attempt, 10))
+                continue
+            # Ошибка в самом запросе: повтор не поможет
+            return data
+        return data
+
+# Клиенты по токенам бота: один пул соединений и один планировщик на бота
+_clients = {}
+
+def get_telegram_client(token=None):
+    """Возвращает общий клиент для токена (по умолчанию — TELEGRAM_BOT_TOKEN)."""
+    token = token or TELEGRAM_BOT_TOKEN
+    client = _clients.get(token)
+    if client is None:
+        client = TelegramClient(token)
+        _clients[token] = client
+    return client
+
+async def close_telegram_clients():
+    """Закрывает сессии всех клиентов."""
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+
+# Маркер отсутствия значения: позволяет кэшировать None как валидный результат
+MISSING = object()
+
+class TTLCache:
+    """LRU-кэш в памяти с ограничением размера и временем жизни записей."""
+    def __init__(self, maxsize, ttl=None):
+        """
+        Параметры:
+            maxsize (int): Максимальное число записей, при превышении вытесняются самые давние
+            ttl (float, optional): Время жизни записи в секундах. None — без ограничения
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        """Возвращает значение по ключу или default, если записи нет или она устарела."""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Сохраняет значение и вытесняет самые давно использованные записи сверх лимита.
+        ttl переопределяет время жизни этой записи.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Удаляет запись и возвращает ее значение."""
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        item = self._data.get(key)
+        return item is not None and (item[0] is None or item[0] >= time.monotonic())
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,74 @@
+import hmac
+import json
+import logging
+from aiohttp import web
+from config import WEBHOOK_PATH
+from telegram_client import get_telegram_client
+from ttl_cache import TTLCache
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+# Типы обновлений, которые обрабатывает бот
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+def update_chat_id(update):
+    """Возвращает chat_id обновления или None, если оно не относится к чату."""
+    return update.get("message", {}).get("chat", {}).get("id") or update.get("callback_query", {}).get("message", {}).get("chat", {}).get("id")
+
+def add_webhook_routes(app, dispatch, secret, path=WEBHOOK_PATH):
+    """
+    Добавляет в приложение aiohttp прием обновлений от Telegram.
+
+    Запрос принимается, только если заголовок X-Telegram-Bot-Api-Secret-Token
+    совпадает с secret. Обновление ставится в очередь диспетчера dispatch(chat_id, update),
+    и Telegram сразу получает ответ 200; повторная доставка того же update_id
+    отбрасывается.
+    """
+    seen = TTLCache(1000)  # Недавние update_id: Telegram повторяет доставку при таймауте
+
+    async def receive(request):
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, secret):
+            logging.warning(f"Отклонен запрос к webhook с неверным секретом от {request.remote}")
+            return web.Response(status=403)
+        try:
+            update = await request.json()
+        except json.JSONDecodeError:
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+
+        update_id = update.get("update_id")
+        if update_id in seen:
+            return web.Response()
+
+        chat_id = update_chat_id(update)
+        # Обновления одного чата идут по порядку, разные чаты — параллельно.
+        # Если диспетчер не принял обновление, оно не отмечается как полученное:
+        # на ответ 503 Telegram повторит доставку позже
+        if chat_id and not dispatch(chat_id, update):
+            return web.Response(status=503)
+        seen.set(update_id, True)
+        return web.Response()
+
+    app.router.add_post(path, receive)
+
+async def set_webhook(base_url, secret, path=WEBHOOK_PATH):
+    """Регистрирует webhook в Telegram. Возвращает True при успехе."""
+    url = base_url.rstrip("/") + path
+    data = await get_telegram_client().call("setWebhook", {
+        "url": url,
+        "secret_token": secret,
+        "allowed_updates": ALLOWED_UPDATES,
+    }, limited=False)
+    if not data or not data.get("ok"):
+        logging.error(f"Не удалось установить webhook {url}: {data}")
+        return False
+    logging.info(f"Webhook установлен: {url}")
+    return True
+
+async def delete_webhook():
+    """Удаляет webhook, чтобы getUpdates снова получал обновления."""
+    data = await get_telegram_client().call("deleteWebhook", {"drop_pending_updates": False}, limited=False)
+    if not data or not data.get("ok"):
+        logging.error(f"Не удалось удалить webhook: {data}")